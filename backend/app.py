@@ -1,6 +1,6 @@
 # app.py - Enhanced with conversation memory
 from fastapi import FastAPI, Request, HTTPException, Depends
-from fastapi.responses import HTMLResponse, JSONResponse
+from fastapi.responses import HTMLResponse, JSONResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
@@ -12,15 +12,29 @@ import os
 import hashlib
 import re
 import uuid
+import json
+import asyncio
 from contextlib import contextmanager
 from sqlalchemy.exc import SQLAlchemyError
 from fastapi.middleware.cors import CORSMiddleware
 from dotenv import load_dotenv
-from backend.database import SessionLocal, Info, init_db
-from backend.claude_api import ask_claude_with_context, clear_cache, cleanup_cache
-from chatgpt_api import ask_openai
+from backend.database import SessionLocal, Info, FaqAnswer, init_db, pool_stats
+from backend.claude_api import stream_claude_with_context, get_cached_response, get_cache_key, clear_cache, cleanup_cache, get_cache_stats, detect_language, classify_query_complexity, fetch_knowledge
+from chatgpt_api import stream_openai
 from email_service import send_feedback_email
-from backend.qdrant_search import qdrant_search
+from backend.qdrant_search import qdrant_search, search_candidates, embed_query, get_vector_search_stats
+from backend.semantic_cache import semantic_cache
+from backend import knowledge_base
+from backend import faq_answers
+from backend.embedding_service import warm_up, is_ready, batching_encoder
+from backend.embedding_store import embedding_store
+from backend.screening import query_screener, message_screener, field_screener
+from backend.sql_cache import invalidate_sql_cache, get_sql_cache_stats
+from backend.cache import create_cache
+from backend import db_events
+from backend.llm_router import LLMRouter
+from backend.resilience import ProviderGuard
+from backend.single_flight import SingleFlight
 
 load_dotenv()
 
@@ -42,13 +56,33 @@ app.add_middleware(
 security = HTTPBearer()
 ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
 
-rate_limit_storage: Dict[str, Dict] = {}
+# Shared across replicas when CACHE_BACKEND=redis
+rate_limit_storage = create_cache("ratelimit", max_entries=int(os.getenv("RATE_LIMIT_MAX_CLIENTS", "100000")))
+
+async def stream_openai_with_context(prompt: str, history: Optional[List[Dict]] = None, database: Optional[str] = None, query_vector=None):
+    """OpenAI fallback with the same history and knowledge lines Claude would get"""
+    language = detect_language(prompt)
+    knowledge = await fetch_knowledge(prompt, language, classify_query_complexity(prompt, language), query_vector)
+    async for delta in stream_openai(prompt, database, history, knowledge):
+        yield delta
+
+# Claude is preferred; OpenAI takes over (or is hedged in) when Claude is slow or failing.
+# Each provider sits behind a circuit breaker and an adaptive concurrency limit.
+provider_guards = {name: ProviderGuard(name) for name in ("claude", "openai")}
+llm_router = LLMRouter({
+    "claude": provider_guards["claude"].wrap(stream_claude_with_context),
+    "openai": provider_guards["openai"].wrap(stream_openai_with_context),
+})
+
+# Identical questions asked at the same moment share one retrieval and LLM call
+answer_flights = SingleFlight()
 
 # NEW: Conversation memory storage
 # Format: {session_id: {"messages": [{"role": "user/assistant", "content": "...", "timestamp": datetime}], "last_active": datetime}}
 conversation_memory: Dict[str, Dict] = {}
 MAX_CONVERSATION_HISTORY = 5  # Keep last 5 messages per session
 CONVERSATION_TIMEOUT = 3600  # 1 hour timeout
+MAINTENANCE_INTERVAL = int(os.getenv("MAINTENANCE_INTERVAL", "300"))  # seconds between cache/session sweeps
 
 def cleanup_old_conversations():
     """Remove expired conversations to prevent memory bloat"""
@@ -111,25 +145,10 @@ def get_client_ip(request: Request) -> str:
         return x_forwarded_for.split(",")[0].strip()
     return request.client.host
 
-def check_rate_limit(client_ip: str, limit: int = 50, window: int = 3600) -> bool:
-    now = datetime.now()
-    
-    if client_ip not in rate_limit_storage:
-        rate_limit_storage[client_ip] = {"count": 1, "window_start": now}
-        return True
-    
-    client_data = rate_limit_storage[client_ip]
-    
-    if now - client_data["window_start"] > timedelta(seconds=window):
-        client_data["count"] = 1
-        client_data["window_start"] = now
-        return True
-    
-    if client_data["count"] >= limit:
-        return False
-    
-    client_data["count"] += 1
-    return True
+async def check_rate_limit(client_ip: str, limit: int = 50, window: int = 3600) -> bool:
+    # Fixed window per client: the counter expires `window` seconds after the first request
+    count = await rate_limit_storage.incr(f"{client_ip}:{window}", ttl=window)
+    return count <= limit
 
 def verify_admin_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
     if credentials.credentials != ADMIN_TOKEN:
@@ -141,25 +160,8 @@ def log_security_event(event_type: str, details: str, request: Request):
     logging.warning(f"SECURITY EVENT - Type: {event_type}, IP: {client_ip}, Details: {details}")
 
 def is_suspicious_query(message: str) -> tuple[bool, str]:
-    suspicious_patterns = [
-        (r"('|(\\'))", "SQL_QUOTES"),
-        (r"(;|\s)(drop|delete|insert|update|alter|create|exec|union|select)\s", "SQL_KEYWORDS"),
-        (r"(union\s+(all\s+)?select)", "SQL_UNION"),
-        (r"(or\s+.+=.+)", "SQL_OR_CONDITION"),
-        (r"(and\s+.+=.+)", "SQL_AND_CONDITION"),
-        (r"(--|\/\*|\*\/)", "SQL_COMMENTS"),
-        (r"\b(database|table|column|schema|version|postgresql|mysql|sqlite)\b", "INFO_DISCLOSURE"),
-        (r"\b(admin|password|user|login|auth|token)\b.*\b(access|show|display|get|list)\b", "PRIVILEGE_REQUEST"),
-        (r"\b(show|list|display|execute|run|query)\s+(table|database|schema|structure)", "SYSTEM_QUERY"),
-        (r"\bselect\s+.*\bfrom\b", "SELECT_STATEMENT"),
-    ]
-    
-    message_lower = message.lower()
-    for pattern, threat_type in suspicious_patterns:
-        if re.search(pattern, message_lower):
-            return True, threat_type
-    
-    return False, ""
+    threat_type = query_screener.screen(message)
+    return threat_type is not None, threat_type or ""
 
 @contextmanager
 def get_db_session():
@@ -188,19 +190,8 @@ class ChatMessage(BaseModel):
         if not v:
             raise ValueError("Message cannot be empty")
         
-        sql_patterns = [
-            r"('|(\\'))",
-            r"(;|\s)(drop|delete|insert|update|alter|create|exec|union|select)\s",
-            r"(union\s+(all\s+)?select)",
-            r"(or\s+.+=.+)",
-            r"(and\s+.+=.+)",
-            r"(--|\/\*|\*\/)",
-        ]
-        
-        message_lower = v.lower()
-        for pattern in sql_patterns:
-            if re.search(pattern, message_lower):
-                raise ValueError("Invalid message content")
+        if message_screener.screen(v):
+            raise ValueError("Invalid message content")
         
         return v
 
@@ -214,16 +205,8 @@ class InfoCreate(BaseModel):
         if not v or not v.strip():
             raise ValueError("Field cannot be empty")
         
-        dangerous_patterns = [
-            r'(\b(DROP|DELETE|INSERT|UPDATE|ALTER|CREATE|EXEC|EXECUTE|UNION|SELECT)\b)',
-            r'(--|;|\*|\/\*|\*\/)',
-            r'(\bOR\b.*=.*\b|\bAND\b.*=.*)',
-            r"('|(\\'))",
-        ]
-        
-        for pattern in dangerous_patterns:
-            if re.search(pattern, v.upper()):
-                raise ValueError(f"Invalid characters detected")
+        if field_screener.screen(v):
+            raise ValueError(f"Invalid characters detected")
         
         return v.strip()
 
@@ -242,48 +225,251 @@ class FeedbackMessage(BaseModel):
 
     @validator('email')
     def validate_email_format(cls, v):
-        import re
         if not re.match(r'^[\w\.-]+@[\w\.-]+\.\w+$', v):
             raise ValueError("Invalid email format")
         return v
 
+warm_up_task: Optional[asyncio.Task] = None
+maintenance_task: Optional[asyncio.Task] = None
+
+async def periodic_maintenance():
+    """Sweep expired cache entries and conversations in the background"""
+    while True:
+        await asyncio.sleep(MAINTENANCE_INTERVAL)
+        try:
+            await cleanup_cache()
+            await rate_limit_storage.purge_expired()
+            cleanup_old_conversations()
+        except Exception as e:
+            logging.error(f"Maintenance sweep failed: {e}")
+
+async def warm_up_embeddings():
+    try:
+        await asyncio.to_thread(warm_up)
+    except Exception as e:
+        logging.error(f"Embedding model warm-up failed: {e}")
+        return
+    # needs the model, so load the knowledge snapshot once it is warm
+    try:
+        await knowledge_base.refresh_snapshot()
+    except Exception as e:
+        logging.error(f"Knowledge snapshot load failed, using full-text search: {e}")
+    try:
+        await faq_answers.load_faq_answers()
+    except Exception as e:
+        logging.error(f"FAQ answers load failed, every question goes to the LLM: {e}")
+
 @app.on_event("startup")
 async def startup():
+    global warm_up_task, maintenance_task
     init_db()
     os.makedirs("logs", exist_ok=True)
+    # Warm up in the background so /health answers while the model loads
+    warm_up_task = asyncio.create_task(warm_up_embeddings())
+    batching_encoder.start()
+    # Drop cached SQL results as soon as Postgres reports a write to their table
+    db_events.subscribe(invalidate_sql_cache)
+    # Cached answers were generated from that data too
+    db_events.subscribe(purge_semantic_cache)
+    db_events.subscribe(knowledge_base.on_table_change)
+    db_events.subscribe(faq_answers.on_table_change)
+    db_events.start_listener()
+    maintenance_task = asyncio.create_task(periodic_maintenance())
     logging.info("=== SYSTEM STARTUP COMPLETE ===")
 
 @app.on_event("shutdown")
 async def shutdown():
-    clear_cache()
+    if maintenance_task is not None:
+        maintenance_task.cancel()
+    await batching_encoder.stop()
+    await db_events.stop_listener()
+    # a shared (Redis) cache still serves the other replicas
+    await clear_cache(include_shared=False)
     logging.info("=== SYSTEM SHUTDOWN COMPLETE ===")
 
 @app.get("/health")
 async def health_check():
     return {"status": "healthy", "timestamp": datetime.now()}
 
+@app.get("/ready")
+async def readiness_check():
+    # Separate from /health: the pod is alive while the model loads, but not ready for chats
+    if not is_ready():
+        return JSONResponse(status_code=503, content={"status": "warming up", "timestamp": datetime.now().isoformat()})
+    return {"status": "ready", "timestamp": datetime.now()}
+
+async def lookup_semantic_cache(message: str, history: List[Dict]):
+    """Embed the question once and check the semantic cache.
+
+    Returns (vector, language, cached answer or None). Follow-ups in a
+    conversation depend on earlier turns, so they never use the cache.
+    """
+    language = detect_language(message)
+    try:
+        vector = await embed_query(message)
+    except Exception as e:
+        logging.warning(f"Query embedding failed: {e}")
+        return None, language, None
+    if history:
+        return vector, language, None
+    return vector, language, semantic_cache.lookup(vector, language)
+
+async def fallback_answer(message: str, history: List[Dict], vector, language: str) -> Optional[str]:
+    """Cached answer to serve while every provider is failing or shedding load.
+
+    Same bar as a normal cache hit: a looser match to a different question would
+    often name a different dean, college or time.
+    """
+    cached = await get_cached_response(message, history)
+    if cached is not None:
+        return cached
+    if vector is not None and not history:
+        match = semantic_cache.lookup(vector, language)
+        if match:
+            return match["answer"]
+    return None
+
+def purge_semantic_cache(table: Optional[str]):
+    # faq_answers holds answers, not university data, and is rewritten whenever they regenerate
+    if table != FaqAnswer.__tablename__:
+        semantic_cache.purge()
+
+def remember_semantic_answer(vector, language: str, message: str, response: str, history: List[Dict]):
+    if vector is not None and not history:
+        semantic_cache.add(vector, language, message, response)
+
+async def search_question(message: str, vector, language: str) -> Optional[List[Dict]]:
+    """The one vector search per question: its top hit picks FAQ answers, all of it feeds retrieval"""
+    try:
+        if vector is None:
+            vector = await embed_query(message)
+        return await search_candidates(vector, language)
+    except Exception as e:
+        logging.warning(f"Vector search failed, answering without database: {e}")
+        return None
+
+async def retrieve_database_context(message: str, points: Optional[List[Dict]]) -> Optional[str]:
+    """One retrieval per question, shared by every provider the router tries"""
+    if not points:
+        return None
+    try:
+        return await qdrant_search(message, points=points)
+    except Exception as e:
+        logging.warning(f"Retrieval failed, answering without database: {e}")
+        return None
+
+async def routed_answer(message: str, history: List[Dict], vector, language: str):
+    """Runs once per flight, so a coalesced answer enters the semantic cache once"""
+    points = await search_question(message, vector, language)
+    # pre-generated answer for a curated question asked almost verbatim
+    faq = faq_answers.match_faq(points) if points and not history else None
+    if faq:
+        logging.info(f"FAQ answer ({faq['score']:.3f}) for: {message[:50]}")
+        yield "faq", faq["answer"]
+        return
+    database = await retrieve_database_context(message, points)
+    chunks = []
+    async for item in llm_router.stream(message, history, database, vector):
+        chunks.append(item[1])
+        yield item
+    remember_semantic_answer(vector, language, message, "".join(chunks), history)
+
+def answer_stream(message: str, history: List[Dict], vector, language: str):
+    """(source, delta) pairs, coalesced with concurrent requests that share the response cache key"""
+    return answer_flights.stream(get_cache_key(message, history), lambda: routed_answer(message, history, vector, language))
+
 @app.post("/chat")
 async def chat_api(request: Request, msg: ChatMessage):
+    session_id = get_or_create_session(msg.session_id)
+    history = get_conversation_context(session_id)
+
+    vector, language, cached = await lookup_semantic_cache(msg.message, history)
+    if cached:
+        logging.info(f"Semantic cache hit ({cached['score']:.3f}) for: {msg.message[:50]}")
+        add_message_to_session(session_id, "user", msg.message)
+        add_message_to_session(session_id, "assistant", cached["answer"])
+        return {"response": cached["answer"], "source": "cache", "session_id": session_id}
+
+    chunks = []
+    source = None
     try:
-        database = qdrant_search(msg.message)
-        response = ask_claude(msg.message, database=database)
-        logging.info(f"User: {msg.message}")
-        logging.info(f"Claude: {response}")
-        return {"response": response, "source": "claude"}
-    except Exception:
-        try:
-            database = qdrant_search(msg.message)
-            response = ask_openai(msg.message, database=database)
-            logging.info(f"OpenAI: {response}")
-            return {"response": response, "source": "openai"}
-        except Exception:
+        async for source, delta in answer_stream(msg.message, history, vector, language):
+            chunks.append(delta)
+        response = "".join(chunks)
+    except Exception as e:
+        logging.error(f"Chat failed: {e}")
+        response = await fallback_answer(msg.message, history, vector, language)
+        if response is None:
             raise HTTPException(status_code=500, detail="Both AI services failed")
+        add_message_to_session(session_id, "user", msg.message)
+        add_message_to_session(session_id, "assistant", response)
+        return {"response": response, "source": "cache", "session_id": session_id}
+    logging.info(f"User: {msg.message}")
+    logging.info(f"{(source or 'llm').title()}: {response}")
+
+    add_message_to_session(session_id, "user", msg.message)
+    add_message_to_session(session_id, "assistant", response)
+    return {"response": response, "source": source, "session_id": session_id}
+
+def sse_event(event: str, data: dict) -> str:
+    """Format one Server-Sent Events frame"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@app.post("/chat/stream")
+async def chat_stream_api(request: Request, msg: ChatMessage):
+    session_id = get_or_create_session(msg.session_id)
+    history = get_conversation_context(session_id)
+
+    async def event_stream():
+        yield sse_event("session", {"session_id": session_id})
+
+        vector, language, cached = await lookup_semantic_cache(msg.message, history)
+        if cached:
+            logging.info(f"Semantic cache hit ({cached['score']:.3f}) for: {msg.message[:50]}")
+            add_message_to_session(session_id, "user", msg.message)
+            add_message_to_session(session_id, "assistant", cached["answer"])
+            yield sse_event("delta", {"text": cached["answer"]})
+            yield sse_event("done", {"source": "cache", "session_id": session_id})
+            return
+
+        # the router fails over (or hedges) before the first token, never after
+        chunks = []
+        source = None
+        try:
+            async for source, delta in answer_stream(msg.message, history, vector, language):
+                chunks.append(delta)
+                yield sse_event("delta", {"text": delta})
+        except Exception as e:
+            logging.error(f"{source or 'LLM'} stream failed: {e}")
+            response = None if chunks else await fallback_answer(msg.message, history, vector, language)
+            if response is None:
+                detail = "Response interrupted" if chunks else "Both AI services failed"
+                yield sse_event("error", {"detail": detail})
+                return
+            add_message_to_session(session_id, "user", msg.message)
+            add_message_to_session(session_id, "assistant", response)
+            yield sse_event("delta", {"text": response})
+            yield sse_event("done", {"source": "cache", "session_id": session_id})
+            return
+
+        response = "".join(chunks)
+        logging.info(f"User: {msg.message}")
+        logging.info(f"{(source or 'llm').title()} (stream): {response}")
+        add_message_to_session(session_id, "user", msg.message)
+        add_message_to_session(session_id, "assistant", response)
+        yield sse_event("done", {"source": source, "session_id": session_id})
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 @app.post("/feedback")
 async def submit_feedback(request: Request, feedback: FeedbackMessage):
     try:
         client_ip = get_client_ip(request)
-        if not check_rate_limit(client_ip, limit=5, window=3600):
+        if not await check_rate_limit(client_ip, limit=5, window=3600):
             raise HTTPException(
                 status_code=429, 
                 detail="Too many feedback submissions. Please try again later."
@@ -327,12 +513,46 @@ async def contact(request: Request):
 @app.get("/admin/stats")
 async def get_stats(_: HTTPAuthorizationCredentials = Depends(verify_admin_token)):
     return {
-        "rate_limit_entries": len(rate_limit_storage),
+        "rate_limit": rate_limit_storage.stats(),
         "active_conversations": len(conversation_memory),
         "total_messages": sum(len(session["messages"]) for session in conversation_memory.values()),
+        "embedding_batches": batching_encoder.get_stats(),
+        "embedding_store": embedding_store.stats(),
+        "db_pool": pool_stats(),
+        "sql_cache": get_sql_cache_stats(),
+        "response_cache": get_cache_stats(),
+        "semantic_cache": semantic_cache.stats(),
+        "knowledge_snapshot": knowledge_base.snapshot_stats(),
+        "faq_answers": faq_answers.faq_stats(),
+        "vector_search": get_vector_search_stats(),
+        "llm_router": llm_router.get_stats(),
+        "request_coalescing": answer_flights.stats(),
+        "provider_guards": {name: guard.stats() for name, guard in provider_guards.items()},
         "timestamp": datetime.now()
     }
 
+@app.post("/admin/cache/sql/invalidate")
+async def invalidate_sql_cache_endpoint(table: Optional[str] = None, _: HTTPAuthorizationCredentials = Depends(verify_admin_token)):
+    # Goes through db_events so every table-change subscriber sees manual invalidations too
+    await db_events.publish(table)
+    return {"status": "sql cache invalidated", "table": table or "*", "entries": get_sql_cache_stats()["entries"]}
+
+@app.post("/admin/cache/semantic/purge")
+async def purge_semantic_cache_endpoint(language: Optional[str] = None, _: HTTPAuthorizationCredentials = Depends(verify_admin_token)):
+    removed = semantic_cache.purge(language)
+    return {"status": "semantic cache purged", "language": language or "*", "removed": removed}
+
+@app.post("/admin/knowledge/refresh")
+async def refresh_knowledge_endpoint(_: HTTPAuthorizationCredentials = Depends(verify_admin_token)):
+    snapshot = await knowledge_base.refresh_snapshot()
+    return {"status": "knowledge snapshot refreshed", "version": snapshot.version, "rows": len(snapshot.lines)}
+
+@app.post("/admin/faq/refresh")
+async def refresh_faq_endpoint(_: HTTPAuthorizationCredentials = Depends(verify_admin_token)):
+    # regenerating ~100 answers takes a while, so it runs in the background
+    faq_answers.schedule_refresh()
+    return {"status": "FAQ answer refresh started", "questions": len(faq_answers.curated_rows())}
+
 @app.post("/admin/conversations/cleanup")
 async def cleanup_conversations_endpoint(_: HTTPAuthorizationCredentials = Depends(verify_admin_token)):
     cleanup_old_conversations()
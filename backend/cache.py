@@ -0,0 +1,301 @@
+# cache.py - Bounded in-process cache (LRU eviction, TTL expiry, entry and byte limits)
+# and the pluggable backends (in-process or Redis) shared by the caches and rate limiter
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional
+
+def estimate_size(value: Any) -> int:
+    """Approximate memory used by a cached value, in bytes"""
+    if isinstance(value, str):
+        return len(value.encode("utf-8"))
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(estimate_size(item) for item in value)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(estimate_size(k) + estimate_size(v) for k, v in value.items())
+    return sys.getsizeof(value)
+
+class LRUCache:
+    """Least-recently-used cache bounded by entry count and total bytes, with optional TTL"""
+
+    def __init__(self, max_entries: int, max_bytes: Optional[int] = None, ttl: Optional[float] = None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        # key -> (value, size, expires_at)
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            if entry[2] is not None and entry[2] <= time.monotonic():
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        size = estimate_size(value)
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+            if self.max_bytes is not None and size > self.max_bytes:
+                # would evict everything else and still not fit
+                self.evictions += 1
+                return
+            self._data[key] = (value, size, expires_at)
+            self._bytes += size
+            while len(self._data) > self.max_entries or (self.max_bytes is not None and self._bytes > self.max_bytes):
+                oldest = next(iter(self._data))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def incr(self, key: Hashable, amount: int = 1, ttl: Optional[float] = None) -> int:
+        """Add to a counter; the expiry is set when the counter is created and kept afterwards"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and (entry[2] is None or entry[2] > time.monotonic()):
+                value = entry[0] + amount
+                self._data[key] = (value, entry[1], entry[2])
+                self._data.move_to_end(key)
+                return value
+        self.set(key, amount, ttl=ttl)
+        return amount
+
+    def delete(self, key: Hashable) -> bool:
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+                return True
+            return False
+
+    def keys(self) -> List[Hashable]:
+        with self._lock:
+            return list(self._data.keys())
+
+    def peek(self, key: Hashable, default: Any = None) -> Any:
+        """Read without touching recency or hit counters"""
+        with self._lock:
+            entry = self._data.get(key)
+            return default if entry is None else entry[0]
+
+    def purge_expired(self) -> int:
+        """Drop expired entries now instead of waiting for them to be read"""
+        now = time.monotonic()
+        with self._lock:
+            expired = [key for key, entry in self._data.items() if entry[2] is not None and entry[2] <= now]
+            for key in expired:
+                self._remove(key)
+            self.expirations += len(expired)
+            return len(expired)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def _remove(self, key: Hashable):
+        _, size, _ = self._data.pop(key)
+        self._bytes -= size
+
+    def __contains__(self, key: Hashable) -> bool:
+        with self._lock:
+            entry = self._data.get(key)
+            return entry is not None and (entry[2] is None or entry[2] > time.monotonic())
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._data),
+            "bytes": self._bytes,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0,
+        }
+
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memory")
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+
+class CacheBackend:
+    """Async key/value interface used by the response cache, embedding cache and rate limiter"""
+
+    name = "base"
+    # True when other replicas read and write the same entries
+    shared = False
+
+    async def get(self, key: str) -> Any:
+        raise NotImplementedError
+
+    async def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        raise NotImplementedError
+
+    async def delete(self, key: str):
+        raise NotImplementedError
+
+    async def incr(self, key: str, ttl: Optional[float] = None) -> int:
+        """Increment a counter, starting its expiry window on first use"""
+        raise NotImplementedError
+
+    async def clear(self):
+        raise NotImplementedError
+
+    async def purge_expired(self) -> int:
+        return 0
+
+    def stats(self) -> Dict:
+        raise NotImplementedError
+
+class InMemoryBackend(CacheBackend):
+    """Per-process backend on top of LRUCache"""
+
+    name = "memory"
+
+    def __init__(self, max_entries: int, max_bytes: Optional[int] = None, ttl: Optional[float] = None):
+        self.cache = LRUCache(max_entries=max_entries, max_bytes=max_bytes, ttl=ttl)
+
+    async def get(self, key: str) -> Any:
+        return self.cache.get(key)
+
+    async def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        self.cache.set(key, value, ttl=ttl)
+
+    async def delete(self, key: str):
+        self.cache.delete(key)
+
+    async def incr(self, key: str, ttl: Optional[float] = None) -> int:
+        return self.cache.incr(key, ttl=ttl)
+
+    async def clear(self):
+        self.cache.clear()
+
+    async def purge_expired(self) -> int:
+        return self.cache.purge_expired()
+
+    def stats(self) -> Dict:
+        return {"backend": self.name, **self.cache.stats()}
+
+class RedisBackend(CacheBackend):
+    """Backend shared by all replicas. Values are JSON encoded under `namespace:`.
+
+    Redis errors are logged and treated as misses so an outage degrades to no caching.
+    """
+
+    name = "redis"
+    shared = True
+
+    def __init__(self, namespace: str, ttl: Optional[float] = None, client=None, url: str = REDIS_URL):
+        if client is None:
+            import redis.asyncio as redis
+            client = redis.from_url(url)
+        self.client = client
+        self.prefix = f"{namespace}:"
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    def _key(self, key: str) -> str:
+        return self.prefix + key
+
+    @staticmethod
+    def _expiry_ms(ttl: Optional[float]) -> Optional[int]:
+        return int(ttl * 1000) if ttl else None
+
+    async def get(self, key: str) -> Any:
+        try:
+            raw = await self.client.get(self._key(key))
+        except Exception as e:
+            self.errors += 1
+            logging.error(f"Redis get failed: {e}")
+            raw = None
+        if raw is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(raw)
+
+    async def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        try:
+            await self.client.set(self._key(key), json.dumps(value), px=self._expiry_ms(ttl or self.ttl))
+        except Exception as e:
+            self.errors += 1
+            logging.error(f"Redis set failed: {e}")
+
+    async def delete(self, key: str):
+        try:
+            await self.client.delete(self._key(key))
+        except Exception as e:
+            self.errors += 1
+            logging.error(f"Redis delete failed: {e}")
+
+    async def incr(self, key: str, ttl: Optional[float] = None) -> int:
+        full_key = self._key(key)
+        try:
+            expiry = self._expiry_ms(ttl or self.ttl)
+            if not expiry:
+                return await self.client.incr(full_key)
+            # one MULTI/EXEC: the key never exists without its expiry
+            async with self.client.pipeline(transaction=True) as pipe:
+                pipe.set(full_key, 0, nx=True, px=expiry)
+                pipe.incr(full_key)
+                _, value = await pipe.execute()
+            return value
+        except Exception as e:
+            self.errors += 1
+            logging.error(f"Redis incr failed: {e}")
+            # fail open: a Redis outage shouldn't lock every student out
+            return 0
+
+    async def clear(self):
+        try:
+            keys = [key async for key in self.client.scan_iter(match=self.prefix + "*")]
+            if keys:
+                await self.client.delete(*keys)
+        except Exception as e:
+            self.errors += 1
+            logging.error(f"Redis clear failed: {e}")
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "backend": self.name,
+            "namespace": self.prefix[:-1],
+            "hits": self.hits,
+            "misses": self.misses,
+            "errors": self.errors,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0,
+        }
+
+def create_cache(namespace: str, max_entries: int, max_bytes: Optional[int] = None, ttl: Optional[float] = None) -> CacheBackend:
+    """Build the configured backend (CACHE_BACKEND=memory|redis)"""
+    if CACHE_BACKEND == "redis":
+        return RedisBackend(namespace, ttl=ttl)
+    return InMemoryBackend(max_entries=max_entries, max_bytes=max_bytes, ttl=ttl)
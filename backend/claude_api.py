@@ -1,20 +1,35 @@
 # claude_api.py - Enhanced with conversation context support
-from anthropic import Anthropic, APIError, RateLimitError
-from openai import OpenAI, OpenAIError
+from anthropic import AsyncAnthropic, APIError, RateLimitError
 from dotenv import load_dotenv
 import os, logging, hashlib, json
-from backend.database import SessionLocal, Info
+import functools
+import asyncio
+from backend.database import AsyncSessionLocal, INFO_SEARCH_DOCUMENT
+from backend.cache import create_cache
+from backend.embedding_service import encode_query
+from backend.knowledge_base import get_snapshot, format_info_line
+from sqlalchemy import text
 import numpy as np
-from functools import lru_cache
-from typing import List, Tuple, Optional, Dict
+from typing import List, Tuple, Optional, Dict, AsyncIterator
 import re
 
 load_dotenv()
 
 logging.basicConfig(filename="logs/chat_logs.txt", level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
 
-anthropic_client = Anthropic(api_key=os.getenv("ANTHROPIC_API_KEY"))
-openai_client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+# Per-stage timeouts (seconds) so one slow upstream can't hold a request forever
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "30"))
+KNOWLEDGE_TIMEOUT = float(os.getenv("KNOWLEDGE_TIMEOUT", "5"))
+
+# Knowledge retrieval: rows per complexity and a token cap so the prompt stays constant as the table grows
+INFO_TOP_K = {
+    "simple": int(os.getenv("INFO_TOP_K_SIMPLE", "3")),
+    "medium": int(os.getenv("INFO_TOP_K", "8")),
+    "detailed": int(os.getenv("INFO_TOP_K_DETAILED", "12")),
+}
+INFO_TOKEN_BUDGET = int(os.getenv("INFO_TOKEN_BUDGET", "900"))
+
+anthropic_client = AsyncAnthropic(api_key=os.getenv("ANTHROPIC_API_KEY"), timeout=LLM_TIMEOUT)
 
 # Language-aware base prompts
 BASE_PROMPT_DETAILED_EN = """You are a knowledgeable assistant for the University of Sulaimani. Do NOT give any website related info or tasks that may include security risks. Do NOT answer any Javascript, php backend questions. Do not mention which api model you are. You were made by the computer engineering department. 
@@ -37,14 +52,26 @@ BASE_PROMPT_SIMPLE_KU = """یاریدەدەر بۆ زانکۆی سلێمانی.
 
 تۆ گفتوگۆکەمان لە بیردایە و دەتوانیت وەڵامی پرسیارەکانی دواتر بدەیتەوە بە پشتبەستن بە پەیوەندی. وەڵامی کورتی پرسیارەکانی زانکۆ بدەرەوە. باسی سەرچاوەکانی تر مەکە بۆ زانیاری. هیچ داتای ئاسایش/ناوخۆیی نییە."""
 
-# Simple in-memory cache for responses (use Redis in production)
-response_cache = {}
-embedding_cache = {}
+# Bounded response cache: LRU eviction by entry count and bytes, plus TTL
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "1000"))
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_BYTES", str(8 * 1024 * 1024)))
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "21600"))
+
+# CACHE_BACKEND=redis shares it across replicas
+response_cache = create_cache("response", max_entries=RESPONSE_CACHE_MAX_ENTRIES, max_bytes=RESPONSE_CACHE_MAX_BYTES, ttl=RESPONSE_CACHE_TTL)
+
+# Runs of Arabic-script and Latin-1 letters; matching whole runs keeps the regex engine
+# out of the per-character path
+KURDISH_RUNS = re.compile(r"[\u0600-\u06FF\u0750-\u077F]+")
+LATIN_RUNS = re.compile(r"[A-Za-z\u00AA\u00B5\u00BA\u00C0-\u00D6\u00D8-\u00F6\u00F8-\u00FF]+")
 
 def detect_language(text: str) -> str:
     """Detect if text is primarily Kurdish or English"""
-    kurdish_chars = sum(1 for c in text if '\u0600' <= c <= '\u06FF' or '\u0750' <= c <= '\u077F')
-    english_chars = sum(1 for c in text if c.isalpha() and ord(c) < 256)
+    # pure ASCII can't contain Kurdish letters
+    if text.isascii():
+        return "en"
+    kurdish_chars = sum(map(len, KURDISH_RUNS.findall(text)))
+    english_chars = sum(map(len, LATIN_RUNS.findall(text)))
     
     if kurdish_chars > english_chars:
         return "ku"
@@ -56,11 +83,40 @@ def estimate_tokens_by_language(text: str, language: str) -> int:
         words = len(text.split())
         chars = len(text)
         word_estimate = words * 5
-        char_estimate = chars // 1.5
+        char_estimate = int(chars // 1.5)
         return max(word_estimate, char_estimate)
     else:
         return len(text) // 4
 
+# TOKEN_COUNTER=tiktoken counts with a BPE tokenizer (optional dependency) instead of the
+# character heuristics; it isn't Claude's own tokenizer, but tracks it far closer for Kurdish
+TOKEN_COUNTER = os.getenv("TOKEN_COUNTER", "estimate")
+TIKTOKEN_ENCODING = os.getenv("TIKTOKEN_ENCODING", "cl100k_base")
+_tokenizer = None
+
+def get_tokenizer():
+    """tiktoken encoding when TOKEN_COUNTER=tiktoken and it is installed, else None"""
+    global _tokenizer, TOKEN_COUNTER
+    if _tokenizer is None and TOKEN_COUNTER == "tiktoken":
+        try:
+            import tiktoken
+            _tokenizer = tiktoken.get_encoding(TIKTOKEN_ENCODING)
+        except Exception as e:
+            logging.warning(f"tiktoken unavailable ({e}), falling back to estimated token counts")
+            TOKEN_COUNTER = "estimate"
+    return _tokenizer
+
+def count_tokens(text: str, language: str) -> int:
+    tokenizer = get_tokenizer()
+    if tokenizer is not None:
+        return len(tokenizer.encode(text, disallowed_special=()))
+    return estimate_tokens_by_language(text, language)
+
+@functools.lru_cache(maxsize=4096)
+def count_tokens_cached(text: str, language: str) -> int:
+    """For pieces that repeat across requests: Info rows and conversation messages"""
+    return count_tokens(text, language)
+
 def get_adaptive_token_limits(language: str, complexity: str) -> dict:
     """Get token limits adapted for language and complexity"""
     base_limits = {
@@ -85,22 +141,6 @@ def get_cache_key(text: str, context: List[Dict] = None) -> str:
     combined = text + context_str
     return hashlib.md5(combined.encode()).hexdigest()
 
-@lru_cache(maxsize=1000)
-def embed_text_cached(text: str) -> Tuple[float, ...]:
-    """Cached embedding with LRU eviction"""
-    cache_key = hashlib.md5(text.encode()).hexdigest()
-    if cache_key in embedding_cache:
-        return tuple(embedding_cache[cache_key])
-    
-    try:
-        resp = openai_client.embeddings.create(model="text-embedding-3-small", input=text)
-        embedding = resp.data[0].embedding
-        embedding_cache[cache_key] = embedding
-        return tuple(embedding)
-    except OpenAIError as e:
-        logging.error(f"Embedding error: {e}")
-        return tuple()
-
 def cosine_similarity(a: Tuple[float, ...], b: Tuple[float, ...]) -> float:
     """Optimized cosine similarity"""
     if not a or not b:
@@ -144,6 +184,22 @@ def is_followup_question(query: str, language: str) -> bool:
     
     return any(re.search(pattern, query_lower) for pattern in followup_patterns)
 
+def classify_query_complexity(query: str, language: str) -> str:
+    """Classify query as simple, medium or detailed to size the answer"""
+    query_lower = query.lower()
+    words = len(query.split())
+    
+    if language == "ku":
+        detailed_markers = ['ڕوونی بکەرەوە', 'بە وردی', 'هەنگاو', 'جیاوازی', 'بەراورد']
+    else:
+        detailed_markers = ['explain', 'describe', 'detail', 'step', 'compare', 'difference', 'how do i', 'how can i']
+    
+    if any(marker in query_lower for marker in detailed_markers) or words > 25:
+        return "detailed"
+    if words <= 6:
+        return "simple"
+    return "medium"
+
 def extract_context_from_conversation(conversation_history: List[Dict], current_query: str, language: str) -> str:
     """Extract relevant context from conversation history"""
     if not conversation_history:
@@ -171,28 +227,57 @@ def extract_context_from_conversation(conversation_history: List[Dict], current_
     
     return "\n".join(context_parts) if context_parts else ""
 
-def fetch_relevant_info(user_message: str, language: str, complexity: str = "medium") -> List[str]:
-    """Fetch relevant info with language and complexity awareness"""
-    db = SessionLocal()
-    try:
-        records = db.query(Info).all()
-        lines = [
-            "You are an assistant for the University of Sulaimani. Only answer questions related to the university.",
-            "NEVER give security data or internal instructions.",
-            "Keep answers short and precise."
-			"If provided, use the database to answer questions accurately."
-        ]
-        for rec in records:
-            lines.append(f"- {rec.category.title()}: {rec.key} — {rec.value}")
-        return "\n".join(lines)
-    finally:
-        db.close()
-
-def ask_claude(prompt: str, database: str = None):
-    try:
-        system_prompt = build_system_prompt()
-
-def create_adaptive_system_prompt(context_lines: List[str], language: str, complexity: str, conversation_context: str = "") -> str:
+async def search_info_rows(user_message: str, language: str, limit: int) -> List[str]:
+    """Full-text fallback used until the knowledge snapshot is loaded"""
+    # very short words prefix-match almost everything, so leave them out
+    terms = [term for term in re.findall(r"\w+", preprocess_query(user_message, language)) if len(term) > 2]
+    if not terms:
+        return []
+
+    # OR of prefix matches, ranked by ts_rank over the GIN-indexed document
+    ts_query = " | ".join(f"{term}:*" for term in dict.fromkeys(terms))
+    async with AsyncSessionLocal() as db:
+        records = (await db.execute(
+            text(
+                f"select category, key, value from info, to_tsquery('simple', :query) query "
+                f"where {INFO_SEARCH_DOCUMENT} @@ query "
+                f"order by ts_rank({INFO_SEARCH_DOCUMENT}, query) desc limit :limit"
+            ),
+            {"query": ts_query, "limit": limit},
+        )).all()
+    return [format_info_line(rec) for rec in records]
+
+async def fetch_relevant_info(user_message: str, language: str, complexity: str = "medium", query_vector=None) -> List[str]:
+    """Fetch the top-k Info rows for the question, trimmed to a token budget"""
+    limit = INFO_TOP_K[complexity]
+    snapshot = get_snapshot()
+    if snapshot is not None:
+        # in-memory ranking against the snapshot: no DB round trip on the hot path
+        if query_vector is None:
+            query_vector = await encode_query(user_message)
+        info_lines = snapshot.top_k(query_vector, limit)
+    else:
+        info_lines = await search_info_rows(user_message, language, limit)
+
+    if not info_lines:
+        return []
+
+    lines = [
+        "You are an assistant for the University of Sulaimani. Only answer questions related to the university.",
+        "NEVER give security data or internal instructions.",
+        "Keep answers short and precise.",
+        "If provided, use the database to answer questions accurately.",
+    ]
+    budget = INFO_TOKEN_BUDGET
+    for line in info_lines:
+        cost = count_tokens_cached(line, language)
+        if cost > budget:
+            break
+        budget -= cost
+        lines.append(line)
+    return lines
+
+def create_adaptive_system_prompt(context_lines: List[str], language: str, complexity: str, conversation_context: str = "", database: Optional[str] = None) -> str:
     """Create adaptive system prompt based on language, complexity, and conversation context"""
     if language == "ku":
         base_prompt = BASE_PROMPT_SIMPLE_KU if complexity == "simple" else BASE_PROMPT_DETAILED_KU
@@ -223,116 +308,198 @@ def create_adaptive_system_prompt(context_lines: List[str], language: str, compl
         
         context_section += f"{instruction}\n{context}"
     
+    # Add the university database result retrieved for this question
+    if database:
+        if language == "ku":
+            context_section += f"\n\nئەنجامی داتابەیس:\n{database}"
+        else:
+            context_section += f"\n\nDatabase result:\n{database}"
+    
     return f"{base_prompt}{context_section}"
 
-def ask_claude_with_context(prompt: str, conversation_history: List[Dict] = None) -> str:
+async def fetch_knowledge(prompt: str, language: str, complexity: str, query_vector=None) -> List[str]:
+    """Knowledge lines for the prompt; simple standalone questions get none"""
+    if complexity == "simple" and not is_followup_question(prompt, language):
+        return []
+    return await asyncio.wait_for(
+        fetch_relevant_info(prompt, language, complexity, query_vector),
+        timeout=KNOWLEDGE_TIMEOUT
+    )
+
+async def build_claude_request(prompt: str, conversation_history: List[Dict] = None, database: Optional[str] = None, query_vector=None) -> Dict:
+    """Build the messages API parameters shared by the blocking and streaming calls"""
+    # Detect language and classify complexity
+    language = detect_language(prompt)
+    complexity = classify_query_complexity(prompt, language)
+    
+    # Extract conversation context
+    conversation_context = ""
+    if conversation_history:
+        conversation_context = extract_context_from_conversation(conversation_history, prompt, language)
+    
+    # Get language-appropriate limits
+    token_config = get_adaptive_token_limits(language, complexity)
+    
+    # Fetch knowledge base context
+    context_lines = await fetch_knowledge(prompt, language, complexity, query_vector)
+    
+    # Create system prompt with conversation, knowledge and database context
+    system_prompt = create_adaptive_system_prompt(context_lines, language, complexity, conversation_context, database)
+
+    # Prepare messages for Claude API
+    messages = []
+    
+    # Add conversation history (last few messages for context)
+    if conversation_history:
+        # Include last 4 messages (2 exchanges) for context, but not too much to exceed token limits
+        recent_history = conversation_history[-4:] if len(conversation_history) > 4 else conversation_history
+        for msg in recent_history:
+            messages.append({"role": msg["role"], "content": msg["content"]})
+    
+    # Add current message
+    messages.append({"role": "user", "content": prompt})
+    
+    # History messages come back every turn, so their counts are cached; the system prompt is per request
+    estimated_prompt_tokens = count_tokens(system_prompt, language) + sum(count_tokens_cached(msg["content"], language) for msg in messages)
+    
+    # Add 20% safety margin for Kurdish due to tokenization unpredictability
+    if language == "ku" and get_tokenizer() is None:
+        estimated_prompt_tokens = int(estimated_prompt_tokens * 1.2)
+    
+    # Adjust max_tokens if prompt is large (4096 token model limit)
+    max_output_tokens = token_config["max_tokens"]
+    total_budget = 4000  # Conservative budget leaving room for model overhead
+    
+    if estimated_prompt_tokens > total_budget * 0.7:  # If prompt uses >70% of budget
+        max_output_tokens = max(100, total_budget - estimated_prompt_tokens)
+        logging.warning(f"Large prompt detected ({estimated_prompt_tokens} tokens), reducing output to {max_output_tokens}")
+        
+        # If still too large, reduce conversation history
+        if estimated_prompt_tokens > total_budget * 0.8:
+            messages = messages[-2:]  # Keep only current message and last response
+            logging.warning("Reduced conversation history due to token limits")
+
+    return {
+        "language": language,
+        "complexity": complexity,
+        "estimated_prompt_tokens": estimated_prompt_tokens,
+        "params": {
+            "model": "claude-3-5-haiku-20241022",
+            "max_tokens": max_output_tokens,
+            "temperature": token_config["temperature"],
+            "system": system_prompt,
+            "messages": messages,
+        },
+    }
+
+def log_claude_usage(request: Dict, response, conversation_history: List[Dict] = None):
+    """Enhanced logging with context info"""
+    input_tokens = response.usage.input_tokens if hasattr(response, 'usage') else 0
+    output_tokens = response.usage.output_tokens if hasattr(response, 'usage') else 0
+    context_info = f", Context: {len(conversation_history) if conversation_history else 0} msgs" if conversation_history else ""
+    logging.info(f"Language: {request['language']}, Complexity: {request['complexity']}, Estimated: {request['estimated_prompt_tokens']}, Actual - Input: {input_tokens}, Output: {output_tokens}{context_info}")
+
+async def ask_claude_with_context(prompt: str, conversation_history: List[Dict] = None, database: Optional[str] = None, query_vector=None, use_cache: bool = True) -> str:
     """Enhanced Claude API call with conversation context support"""
     try:
         # Include conversation context in cache key
         cache_key = get_cache_key(prompt, conversation_history)
-        if cache_key in response_cache:
+        cached = await response_cache.get(cache_key) if use_cache else None
+        if cached is not None:
             logging.info(f"Cache hit for contextual query: {prompt[:50]}...")
-            return response_cache[cache_key]
-
-        # Detect language and classify complexity
-        language = detect_language(prompt)
-        complexity = classify_query_complexity(prompt, language)
-        
-        # Extract conversation context
-        conversation_context = ""
-        if conversation_history:
-            conversation_context = extract_context_from_conversation(conversation_history, prompt, language)
-        
-        # Get language-appropriate limits
-        token_config = get_adaptive_token_limits(language, complexity)
-        
-        # Fetch knowledge base context
-        if complexity == "simple" and not is_followup_question(prompt, language):
-            context_lines = []
-        else:
-            context_lines = fetch_relevant_info(prompt, language, complexity)
-        
-        # Create system prompt with both conversation and knowledge context
-        system_prompt = create_adaptive_system_prompt(context_lines, language, complexity, conversation_context)
+            return cached
 
-        # Prepare messages for Claude API
-        messages = []
-        
-        # Add conversation history (last few messages for context)
-        if conversation_history:
-            # Include last 4 messages (2 exchanges) for context, but not too much to exceed token limits
-            recent_history = conversation_history[-4:] if len(conversation_history) > 4 else conversation_history
-            for msg in recent_history:
-                messages.append({"role": msg["role"], "content": msg["content"]})
-        
-        # Add current message
-        messages.append({"role": "user", "content": prompt})
-        
-        # Estimate total prompt tokens with safety margin
-        full_context = system_prompt + " ".join([msg["content"] for msg in messages])
-        estimated_prompt_tokens = estimate_tokens_by_language(full_context, language)
-        
-        # Add 20% safety margin for Kurdish due to tokenization unpredictability
-        if language == "ku":
-            estimated_prompt_tokens = int(estimated_prompt_tokens * 1.2)
-        
-        # Adjust max_tokens if prompt is large (4096 token model limit)
-        max_output_tokens = token_config["max_tokens"]
-        total_budget = 4000  # Conservative budget leaving room for model overhead
-        
-        if estimated_prompt_tokens > total_budget * 0.7:  # If prompt uses >70% of budget
-            max_output_tokens = max(100, total_budget - estimated_prompt_tokens)
-            logging.warning(f"Large prompt detected ({estimated_prompt_tokens} tokens), reducing output to {max_output_tokens}")
-            
-            # If still too large, reduce conversation history
-            if estimated_prompt_tokens > total_budget * 0.8:
-                messages = messages[-2:]  # Keep only current message and last response
-                logging.warning("Reduced conversation history due to token limits")
+        request = await build_claude_request(prompt, conversation_history, database, query_vector)
 
         # API call with conversation context
-        response = anthropic_client.messages.create(
-            model="claude-3-5-haiku-20241022",
-            max_tokens=max_output_tokens,
-            temperature=token_config["temperature"],
-            system=system_prompt,
-            messages=messages
+        response = await asyncio.wait_for(
+            anthropic_client.messages.create(**request["params"]),
+            timeout=LLM_TIMEOUT
         )
         
         answer = response.content[0].text
         
         # Cache the response with context
-        response_cache[cache_key] = answer
-        
-        # Enhanced logging with context info
-        input_tokens = response.usage.input_tokens if hasattr(response, 'usage') else 0
-        output_tokens = response.usage.output_tokens if hasattr(response, 'usage') else 0
-        context_info = f", Context: {len(conversation_history) if conversation_history else 0} msgs" if conversation_history else ""
-        logging.info(f"Language: {language}, Complexity: {complexity}, Estimated: {estimated_prompt_tokens}, Actual - Input: {input_tokens}, Output: {output_tokens}{context_info}")
+        await response_cache.set(cache_key, answer)
+        log_claude_usage(request, response, conversation_history)
         
         return answer
         
     except (RateLimitError, APIError) as e:
+        # re-raised as is so callers can tell rate limits and overload apart
         logging.error(f"Claude API error: {e}")
-        raise Exception("Claude API error")
+        raise
+    except asyncio.TimeoutError:
+        logging.error(f"Claude timed out for query: {prompt[:50]}...")
+        raise
+    except Exception as e:
+        logging.error(f"Unexpected Claude error: {e}")
+        raise
+
+async def stream_claude_with_context(prompt: str, conversation_history: List[Dict] = None, database: Optional[str] = None, query_vector=None) -> AsyncIterator[str]:
+    """Streaming variant of ask_claude_with_context, yields text deltas as they arrive"""
+    try:
+        cache_key = get_cache_key(prompt, conversation_history)
+        cached = await response_cache.get(cache_key)
+        if cached is not None:
+            logging.info(f"Cache hit for contextual query: {prompt[:50]}...")
+            yield cached
+            return
+
+        request = await build_claude_request(prompt, conversation_history, database, query_vector)
+
+        chunks = []
+        async with anthropic_client.messages.stream(**request["params"]) as stream:
+            deltas = stream.text_stream.__aiter__()
+            while True:
+                # LLM_TIMEOUT bounds the gap between deltas, not the whole answer
+                try:
+                    text = await asyncio.wait_for(deltas.__anext__(), timeout=LLM_TIMEOUT)
+                except StopAsyncIteration:
+                    break
+                chunks.append(text)
+                yield text
+            response = await stream.get_final_message()
+
+        # Only complete answers are cached
+        await response_cache.set(cache_key, "".join(chunks))
+        log_claude_usage(request, response, conversation_history)
+
+    except (RateLimitError, APIError) as e:
+        # re-raised as is so callers can tell rate limits and overload apart
+        logging.error(f"Claude API error: {e}")
+        raise
+    except asyncio.TimeoutError:
+        logging.error(f"Claude stream timed out for query: {prompt[:50]}...")
+        raise
     except Exception as e:
         logging.error(f"Unexpected Claude error: {e}")
         raise
 
 # Backward compatibility - keep the old function
-def ask_claude(prompt: str) -> str:
+async def ask_claude(prompt: str, database: Optional[str] = None) -> str:
     """Backward compatibility wrapper"""
-    return ask_claude_with_context(prompt, None)
+    return await ask_claude_with_context(prompt, None, database)
 
-def clear_cache():
+async def get_cached_response(prompt: str, conversation_history: List[Dict] = None) -> Optional[str]:
+    """Previously generated answer for this exact question and context, if any"""
+    return await response_cache.get(get_cache_key(prompt, conversation_history))
+
+async def clear_cache(include_shared: bool = True):
     """Clear response cache - useful for production management"""
-    response_cache.clear()
-    embed_text_cached.cache_clear()
-    logging.info("Caches cleared")
-
-def cleanup_cache():
-    """Remove old cache entries to prevent memory bloat"""
-    if len(response_cache) > 1000:  # Keep only 1000 most recent
-        keys_to_remove = list(response_cache.keys())[:-500]
-        for key in keys_to_remove:
-            del response_cache[key]
-        logging.info("Cache cleanup completed")
\ No newline at end of file
+    if response_cache.shared and not include_shared:
+        return
+    await response_cache.clear()
+    logging.info("Response cache cleared")
+
+async def cleanup_cache():
+    """Drop expired entries; size limits are enforced on every insert"""
+    expired = await response_cache.purge_expired()
+    if expired:
+        logging.info(f"Cache cleanup removed {expired} expired responses")
+
+def get_cache_stats() -> Dict:
+    return {
+        "responses": response_cache.stats(),
+        "token_counts": {"counter": TOKEN_COUNTER, **count_tokens_cached.cache_info()._asdict()},
+    }
\ No newline at end of file
@@ -1,15 +1,43 @@
-from sqlalchemy import create_engine, Column, Integer, String, Text
+from sqlalchemy import create_engine, Column, DateTime, Integer, String, Text, text
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 import os
 from dotenv import load_dotenv
+from backend.db_events import TRIGGER_FUNCTION_SQL, trigger_statements
 
 load_dotenv()
 
 DATABASE_URL = os.getenv("DATABASE_URL")
 
-engine = create_engine(DATABASE_URL, echo=False)
+# Bounded connection pools: at most DB_POOL_SIZE + DB_MAX_OVERFLOW connections per engine
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "5"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+
+pool_settings = {
+    "pool_size": DB_POOL_SIZE,
+    "max_overflow": DB_MAX_OVERFLOW,
+    "pool_timeout": DB_POOL_TIMEOUT,
+    "pool_recycle": DB_POOL_RECYCLE,
+    "pool_pre_ping": True,
+}
+
+def to_async_url(url: str) -> str:
+    """Point a postgres URL at the asyncpg driver"""
+    for prefix in ("postgresql+psycopg2://", "postgresql://", "postgres://"):
+        if url.startswith(prefix):
+            return "postgresql+asyncpg://" + url[len(prefix):]
+    return url
+
+engine = create_engine(DATABASE_URL, echo=False, **pool_settings)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+# The chat path (knowledge lookup and Qdrant command lookup) shares this pool
+async_engine = create_async_engine(to_async_url(DATABASE_URL), echo=False, **pool_settings)
+AsyncSessionLocal = async_sessionmaker(async_engine, expire_on_commit=False)
+
 Base = declarative_base()
 
 class Info(Base):
@@ -19,5 +47,46 @@ class Info(Base):
     key = Column(String(255), index=True)
     value = Column(Text)
 
+class FaqAnswer(Base):
+    """Pre-generated answer for one curated question (keyed by its Qdrant point id)"""
+    __tablename__ = "faq_answers"
+    id = Column(Integer, primary_key=True, index=True)
+    point_id = Column(String(36), unique=True, index=True, nullable=False)
+    question = Column(Text, nullable=False)
+    lang = Column(String(8))
+    command = Column(Text, nullable=False)
+    answer = Column(Text, nullable=False)
+    generated_at = Column(DateTime, nullable=False)
+
+# Full-text document for Info rows; 'simple' config so Kurdish and English are tokenised alike
+INFO_SEARCH_DOCUMENT = "to_tsvector('simple', coalesce(category, '') || ' ' || coalesce(key, '') || ' ' || coalesce(value, ''))"
+
 def init_db():
     Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(text(f"CREATE INDEX IF NOT EXISTS ix_info_search ON info USING gin ({INFO_SEARCH_DOCUMENT})"))
+        # caches, the knowledge snapshot and FAQ answers are invalidated by these notifications;
+        # the table locks serialise replicas starting at the same time
+        conn.exec_driver_sql(TRIGGER_FUNCTION_SQL)
+        for table in (Info.__tablename__, FaqAnswer.__tablename__):
+            for statement in trigger_statements(table):
+                conn.exec_driver_sql(statement)
+
+def describe_pool(pool) -> dict:
+    """Pool usage, where saturation is checked-out connections over the hard limit"""
+    limit = DB_POOL_SIZE + DB_MAX_OVERFLOW
+    checked_out = pool.checkedout()
+    return {
+        "pool_size": pool.size(),
+        "max_overflow": DB_MAX_OVERFLOW,
+        "checked_out": checked_out,
+        "checked_in": pool.checkedin(),
+        "overflow": max(pool.overflow(), 0),
+        "saturation": round(checked_out / limit, 3) if limit else None,
+    }
+
+def pool_stats() -> dict:
+    return {
+        "sync": describe_pool(engine.pool),
+        "async": describe_pool(async_engine.sync_engine.pool),
+    }
@@ -0,0 +1,137 @@
+# db_events.py - Postgres change notifications (LISTEN/NOTIFY) for cache invalidation
+import asyncio
+import logging
+import os
+from typing import Awaitable, Callable, List, Optional, Set, Union
+
+import asyncpg
+from dotenv import load_dotenv
+
+load_dotenv()
+
+DATABASE_URL = os.getenv("DATABASE_URL")
+CHANNEL = "table_changed"
+RECONNECT_DELAY = float(os.getenv("DB_EVENTS_RECONNECT_DELAY", "5"))
+
+# Statement-level trigger: one notification per write statement, payload is the table name
+TRIGGER_FUNCTION_SQL = f"""
+CREATE OR REPLACE FUNCTION notify_table_change() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify('{CHANNEL}', TG_TABLE_NAME);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+def trigger_statements(table: str) -> List[str]:
+    """Idempotent DDL attaching the notify trigger to one table"""
+    return [
+        f'DROP TRIGGER IF EXISTS notify_change ON "{table}"',
+        f'CREATE TRIGGER notify_change AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON "{table}" '
+        f"FOR EACH STATEMENT EXECUTE FUNCTION notify_table_change()",
+    ]
+
+# A subscriber receives the changed table name, or None when notifications
+# may have been missed (listener reconnected) and everything should be treated as changed
+Subscriber = Callable[[Optional[str]], Union[None, Awaitable[None]]]
+
+_subscribers: List[Subscriber] = []
+_listener_task: Optional[asyncio.Task] = None
+# publish tasks started from notification callbacks, kept so they aren't garbage-collected
+_publish_tasks: Set[asyncio.Task] = set()
+
+def subscribe(callback: Subscriber):
+    """Register a callback for table changes"""
+    _subscribers.append(callback)
+
+async def publish(table: Optional[str]):
+    """Deliver a change to every subscriber; also used by admin endpoints"""
+    for callback in _subscribers:
+        try:
+            result = callback(table)
+            if asyncio.iscoroutine(result):
+                await result
+        except Exception as e:
+            logging.error(f"Table change subscriber failed for {table}: {e}")
+
+def plain_url(url: str) -> str:
+    """asyncpg only understands plain postgresql:// URLs"""
+    for prefix in ("postgresql+psycopg2://", "postgresql+asyncpg://"):
+        if url.startswith(prefix):
+            return "postgresql://" + url[len(prefix):]
+    return url
+
+async def install_triggers(conn):
+    """Attach the notify trigger to every table in the public schema.
+
+    init_db covers the tables the app creates and db/uos_database.sql the ones it
+    creates; this (python -m backend.db_events) adds tables created any other way.
+    """
+    await conn.execute(TRIGGER_FUNCTION_SQL)
+    tables = await conn.fetch(
+        "select table_name from information_schema.tables "
+        "where table_schema = 'public' and table_type = 'BASE TABLE'"
+    )
+    for row in tables:
+        table = row["table_name"]
+        for statement in trigger_statements(table):
+            await conn.execute(statement)
+    logging.info(f"Change notification triggers installed on {len(tables)} tables")
+
+async def _listen_forever():
+    first_connect = True
+    while True:
+        conn = None
+        try:
+            conn = await asyncpg.connect(plain_url(DATABASE_URL))
+
+            def on_notify(_conn, _pid, _channel, payload):
+                task = asyncio.create_task(publish(payload))
+                _publish_tasks.add(task)
+                task.add_done_callback(_publish_tasks.discard)
+
+            await conn.add_listener(CHANNEL, on_notify)
+            if not first_connect:
+                # changes during the outage were not delivered
+                await publish(None)
+            first_connect = False
+            logging.info("Listening for table change notifications")
+
+            while not conn.is_closed():
+                await asyncio.sleep(RECONNECT_DELAY)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logging.error(f"Table change listener error: {e}")
+        finally:
+            if conn is not None and not conn.is_closed():
+                await conn.close()
+        first_connect = False
+        await asyncio.sleep(RECONNECT_DELAY)
+
+def start_listener():
+    global _listener_task
+    if _listener_task is None or _listener_task.done():
+        _listener_task = asyncio.create_task(_listen_forever())
+
+async def stop_listener():
+    global _listener_task
+    if _listener_task is not None:
+        _listener_task.cancel()
+        try:
+            await _listener_task
+        except asyncio.CancelledError:
+            pass
+        _listener_task = None
+
+async def install_all_triggers():
+    conn = await asyncpg.connect(plain_url(DATABASE_URL))
+    try:
+        await install_triggers(conn)
+    finally:
+        await conn.close()
+
+# run from the repo root after adding tables outside the app: python -m backend.db_events
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(install_all_triggers())
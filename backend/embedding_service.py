@@ -0,0 +1,186 @@
+# embedding_service.py - One shared sentence-transformer per process
+import asyncio
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from backend.embedding_store import embedding_store
+
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "paraphrase-multilingual-mpnet-base-v2")
+
+_model = None
+_model_lock = threading.Lock()
+_ready = False
+_store_error_logged = False
+
+def get_model():
+    """Load the embedding model on first use; later calls reuse the same instance"""
+    global _model
+    if _model is None:
+        with _model_lock:
+            if _model is None:
+                # Imported here so importing this module stays cheap
+                from sentence_transformers import SentenceTransformer
+                logging.info(f"Loading embedding model {EMBEDDING_MODEL}")
+                _model = SentenceTransformer(EMBEDDING_MODEL)
+    return _model
+
+def encode(texts, **kwargs):
+    """Encode one string or a list of strings with the shared model"""
+    return get_model().encode(texts, **kwargs)
+
+def _store_failed(e: Exception):
+    """The store is only a cache: log the first failure and keep encoding with the model"""
+    global _store_error_logged
+    if not _store_error_logged:
+        _store_error_logged = True
+        logging.error(f"Embedding store unavailable, encoding with the model instead: {e!r}")
+
+def encode_cached(texts: List[str], persist: bool = True, **kwargs) -> np.ndarray:
+    """Encode a list of strings, reusing vectors from the persistent embedding store.
+
+    Only texts this model hasn't embedded before reach the model; with persist=False
+    their vectors aren't written back (user questions would grow the store forever).
+    Vectors are stored as raw model output, so don't pass options that change it
+    (e.g. normalize_embeddings); normalise the result instead.
+    """
+    try:
+        vectors = embedding_store.get_many(EMBEDDING_MODEL, texts)
+    except (sqlite3.Error, OSError) as e:
+        _store_failed(e)
+        vectors = [None] * len(texts)
+    missing = [i for i, vector in enumerate(vectors) if vector is None]
+    if missing:
+        new_texts = list(dict.fromkeys(texts[i] for i in missing))
+        fresh = encode(new_texts, **kwargs)
+        if persist:
+            try:
+                embedding_store.put_many(EMBEDDING_MODEL, new_texts, fresh)
+            except (sqlite3.Error, OSError) as e:
+                _store_failed(e)
+        by_text = {text: np.asarray(vector, dtype=np.float32) for text, vector in zip(new_texts, fresh)}
+        for i in missing:
+            vectors[i] = by_text[texts[i]]
+    if not vectors:
+        return np.zeros((0, 0), dtype=np.float32)
+    return np.stack(vectors)
+
+def warm_up():
+    """Load the model and run a first encode so the first user request isn't slow"""
+    global _ready
+    encode(["Who is the dean of the College of Engineering?", "کێ ڕاگری کۆلێژی ئەندازیارییە؟"])
+    _ready = True
+    logging.info("Embedding model warm-up complete")
+
+def is_ready() -> bool:
+    """True once warm_up has finished"""
+    return _ready
+
+# Micro-batching for query embeddings: concurrent requests arriving within
+# EMBED_BATCH_MAX_WAIT_MS of each other share one encode call
+EMBED_BATCH_MAX_SIZE = int(os.getenv("EMBED_BATCH_MAX_SIZE", "32"))
+EMBED_BATCH_MAX_WAIT_MS = float(os.getenv("EMBED_BATCH_MAX_WAIT_MS", "5"))
+
+class BatchingEncoder:
+    """Coalesces concurrent encode requests into batched model calls"""
+
+    def __init__(self, max_batch_size: int = EMBED_BATCH_MAX_SIZE, max_wait_ms: float = EMBED_BATCH_MAX_WAIT_MS):
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self.stats = {
+            "requests": 0,
+            "batches": 0,
+            "max_batch_size": 0,
+            "total_queue_delay_ms": 0.0,
+            "max_queue_delay_ms": 0.0,
+        }
+
+    def start(self):
+        """Start the background batching task on the running event loop"""
+        if self._worker is None or self._worker.done():
+            self._queue = asyncio.Queue()
+            self._worker = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+
+    async def encode(self, text: str):
+        """Queue one text and wait for its vector"""
+        self.start()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((text, future, time.perf_counter()))
+        return await future
+
+    async def _run(self):
+        while True:
+            batch = [await self._queue.get()]
+            deadline = time.perf_counter() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout=remaining))
+                except asyncio.TimeoutError:
+                    break
+
+            # Drop requests whose caller already gave up (e.g. timed out)
+            batch = [item for item in batch if not item[1].cancelled()]
+            if not batch:
+                continue
+
+            started = time.perf_counter()
+            self._record_batch([started - enqueued for _, _, enqueued in batch])
+            try:
+                # curated questions come from the store, user questions aren't stored
+                vectors = await asyncio.to_thread(encode_cached, [text for text, _, _ in batch], persist=False)
+            except Exception as e:
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            for (_, future, _), vector in zip(batch, vectors):
+                if not future.done():
+                    future.set_result(vector)
+
+    def _record_batch(self, queue_delays: List[float]):
+        size = len(queue_delays)
+        self.stats["requests"] += size
+        self.stats["batches"] += 1
+        self.stats["max_batch_size"] = max(self.stats["max_batch_size"], size)
+        delays_ms = [delay * 1000 for delay in queue_delays]
+        self.stats["total_queue_delay_ms"] += sum(delays_ms)
+        self.stats["max_queue_delay_ms"] = max(self.stats["max_queue_delay_ms"], max(delays_ms))
+
+    def get_stats(self) -> Dict:
+        batches = self.stats["batches"]
+        requests = self.stats["requests"]
+        return {
+            "requests": requests,
+            "batches": batches,
+            "avg_batch_size": round(requests / batches, 2) if batches else 0,
+            "max_batch_size": self.stats["max_batch_size"],
+            "avg_queue_delay_ms": round(self.stats["total_queue_delay_ms"] / requests, 3) if requests else 0,
+            "max_queue_delay_ms": round(self.stats["max_queue_delay_ms"], 3),
+            "queued": self._queue.qsize() if self._queue else 0,
+        }
+
+batching_encoder = BatchingEncoder()
+
+async def encode_query(text: str):
+    """Encode a single user query through the shared micro-batcher"""
+    return await batching_encoder.encode(text)
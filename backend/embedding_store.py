@@ -0,0 +1,99 @@
+# embedding_store.py - Persistent embedding cache keyed by (model, text hash)
+#
+# Vectors are raw model output (float32, not normalised) stored in SQLite, so restarts,
+# Qdrant rebuilds and snapshot reloads only run the model on text it has never seen.
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+from typing import Dict, List, Optional
+
+import numpy as np
+
+EMBEDDING_STORE_PATH = os.getenv("EMBEDDING_STORE_PATH", "data/embeddings.sqlite3")
+
+# SQLite's default limit on bound parameters per statement is 999
+LOOKUP_CHUNK = 500
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+class EmbeddingStore:
+    """Thread-safe SQLite table of vectors; an empty path disables persistence"""
+
+    def __init__(self, path: str = EMBEDDING_STORE_PATH):
+        self.path = path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        # rows in the table, counted once on open and kept up to date by put_many
+        self.vectors: Optional[int] = None
+
+    def _connect(self) -> Optional[sqlite3.Connection]:
+        if self._conn is None and self.path:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                "model TEXT NOT NULL, text_hash TEXT NOT NULL, dim INTEGER NOT NULL, vector BLOB NOT NULL, "
+                "PRIMARY KEY (model, text_hash))"
+            )
+            self.vectors = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            logging.info(f"Embedding store opened at {self.path} ({self.vectors} vectors)")
+        return self._conn
+
+    def get_many(self, model: str, texts: List[str]) -> List[Optional[np.ndarray]]:
+        """Stored vector per text, None where it hasn't been embedded with this model"""
+        hashes = [text_hash(text) for text in texts]
+        found: Dict[str, np.ndarray] = {}
+        with self._lock:
+            conn = self._connect()
+            if conn is not None:
+                unique = list(dict.fromkeys(hashes))
+                for start in range(0, len(unique), LOOKUP_CHUNK):
+                    chunk = unique[start:start + LOOKUP_CHUNK]
+                    rows = conn.execute(
+                        f"SELECT text_hash, vector FROM embeddings WHERE model = ? AND text_hash IN ({','.join('?' * len(chunk))})",
+                        [model, *chunk],
+                    )
+                    for digest, blob in rows:
+                        found[digest] = np.frombuffer(blob, dtype=np.float32)
+            vectors = [found.get(digest) for digest in hashes]
+            hits = sum(vector is not None for vector in vectors)
+            self.hits += hits
+            self.misses += len(vectors) - hits
+        return vectors
+
+    def put_many(self, model: str, texts: List[str], vectors):
+        with self._lock:
+            conn = self._connect()
+            if conn is None:
+                return
+            rows = []
+            for text, vector in zip(texts, vectors):
+                vector = np.asarray(vector, dtype=np.float32)
+                rows.append((model, text_hash(text), vector.shape[0], vector.tobytes()))
+            # a model's vector for a text never changes, so an existing row is kept
+            with conn:
+                inserted = conn.executemany("INSERT OR IGNORE INTO embeddings (model, text_hash, dim, vector) VALUES (?, ?, ?, ?)", rows).rowcount
+            self.writes += inserted
+            self.vectors += inserted
+
+    def stats(self) -> Dict:
+        """Counters only, so it is safe to call from the event loop"""
+        lookups = self.hits + self.misses
+        return {
+            "path": self.path or None,
+            "vectors": self.vectors,
+            "hits": self.hits,
+            "misses": self.misses,
+            "writes": self.writes,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0,
+        }
+
+embedding_store = EmbeddingStore()
@@ -0,0 +1,177 @@
+# faq_answers.py - Pre-generated answers for the curated questions in qdrant_datasets.py
+#
+# run from the repo root: python -m backend.faq_answers
+#
+# The job runs each curated question's command, has Claude answer it once and stores the
+# answer in faq_answers. The app keeps those answers in memory and serves one directly
+# when the question's best retrieval match (in its language) scores at least FAQ_MIN_SCORE.
+# A write to a table an answer's command reads drops that answer from the fast path on
+# every replica. With FAQ_AUTO_REFRESH, whichever replica gets the advisory lock
+# regenerates it; the others reload once the new answers are stored.
+import asyncio
+import logging
+import os
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Set
+
+from sqlalchemy import delete, select, text
+from sqlalchemy.dialects.postgresql import insert
+
+from backend.claude_api import ask_claude_with_context
+from backend.database import AsyncSessionLocal, FaqAnswer, async_engine
+from backend.qdrant_builder import clean_rows, point_id
+from backend.qdrant_datasets import datasets
+from backend.qdrant_search import SQL_TIMEOUT, format_database_context, run_command
+from backend.sql_cache import tables_in
+
+FAQ_MIN_SCORE = float(os.getenv("FAQ_MIN_SCORE", "0.95"))
+FAQ_AUTO_REFRESH = os.getenv("FAQ_AUTO_REFRESH", "true").lower() == "true"
+FAQ_PRECOMPUTE_CONCURRENCY = int(os.getenv("FAQ_PRECOMPUTE_CONCURRENCY", "4"))
+# Seconds a replica that didn't get the refresh lock waits before checking its answers again
+FAQ_REFRESH_RETRY_INTERVAL = float(os.getenv("FAQ_REFRESH_RETRY_INTERVAL", "30"))
+
+# Session-level advisory lock: one regeneration at a time across all replicas
+REFRESH_LOCK_SQL = "select pg_try_advisory_lock(hashtext('faq_answers'))"
+REFRESH_UNLOCK_SQL = "select pg_advisory_unlock(hashtext('faq_answers'))"
+
+# point id -> {"question", "answer", "tables"}
+_answers: Dict[str, Dict] = {}
+# invalidated id -> when; a reload only accepts answers generated after that
+_pending: Dict[str, datetime] = {}
+_refresh_tasks: Set[asyncio.Task] = set()
+stats = {"hits": 0, "misses": 0, "invalidated": 0, "generated": 0, "failed": 0}
+
+def curated_rows() -> Dict[str, dict]:
+    return {point_id(row): row for row in clean_rows(datasets)}
+
+async def generate_answer(row: dict) -> str:
+    """Answer one curated question from fresh data, bypassing the response cache"""
+    rows = await asyncio.wait_for(run_command(row["command"]), timeout=SQL_TIMEOUT)
+    database = format_database_context([{"question": row["questions"], "rows": rows}])
+    return await ask_claude_with_context(row["questions"], None, database, use_cache=False)
+
+async def precompute_faq_answers(point_ids: Optional[Iterable[str]] = None) -> Dict:
+    """Generate and store answers for every curated question, or only the given ids"""
+    rows = curated_rows()
+    if point_ids is not None:
+        rows = {pid: rows[pid] for pid in point_ids if pid in rows}
+    semaphore = asyncio.Semaphore(FAQ_PRECOMPUTE_CONCURRENCY)
+
+    async def answer(pid: str, row: dict) -> Optional[dict]:
+        async with semaphore:
+            try:
+                text = await generate_answer(row)
+            except Exception as e:
+                logging.error(f"FAQ answer failed for '{row['questions']}': {e}")
+                stats["failed"] += 1
+                return None
+        return {"point_id": pid, "question": row["questions"], "lang": row["lang"], "command": row["command"], "answer": text, "generated_at": datetime.now()}
+
+    results = [result for result in await asyncio.gather(*(answer(pid, row) for pid, row in rows.items())) if result]
+    if results:
+        statement = insert(FaqAnswer).values(results)
+        statement = statement.on_conflict_do_update(
+            index_elements=[FaqAnswer.point_id],
+            set_={column: statement.excluded[column] for column in ("question", "lang", "command", "answer", "generated_at")},
+        )
+        async with AsyncSessionLocal() as db:
+            await db.execute(statement)
+            if point_ids is None:
+                # questions removed from the dataset
+                await db.execute(delete(FaqAnswer).where(FaqAnswer.point_id.not_in(list(rows))))
+            await db.commit()
+
+    for result in results:
+        _pending.pop(result["point_id"], None)
+        _answers[result["point_id"]] = {"question": result["question"], "answer": result["answer"], "tables": tables_in(result["command"])}
+    stats["generated"] += len(results)
+    logging.info(f"FAQ answers generated for {len(results)} of {len(rows)} questions")
+    return {"questions": len(rows), "generated": len(results), "failed": len(rows) - len(results)}
+
+async def load_faq_answers() -> int:
+    """(Re)load stored answers into memory"""
+    global _answers
+    async with AsyncSessionLocal() as db:
+        records = (await db.execute(select(FaqAnswer))).scalars().all()
+    answers = {}
+    for rec in records:
+        invalidated_at = _pending.get(rec.point_id)
+        if invalidated_at is not None:
+            if rec.generated_at <= invalidated_at:
+                continue
+            del _pending[rec.point_id]
+        answers[rec.point_id] = {"question": rec.question, "answer": rec.answer, "tables": tables_in(rec.command)}
+    _answers = answers
+    logging.info(f"Loaded {len(_answers)} FAQ answers")
+    return len(_answers)
+
+def match_faq(points: List[Dict]) -> Optional[Dict]:
+    """Stored answer when the retrieval search's top hit is a curated question scoring at least FAQ_MIN_SCORE"""
+    if not _answers:
+        return None
+    top = points[0] if points else None
+    entry = _answers.get(top["id"]) if top and top["score"] >= FAQ_MIN_SCORE else None
+    if entry is None:
+        stats["misses"] += 1
+        return None
+    stats["hits"] += 1
+    return {"question": entry["question"], "answer": entry["answer"], "score": top["score"]}
+
+async def refresh_answers(point_ids: Optional[List[str]] = None) -> Optional[Dict]:
+    """Regenerate answers (all, or the given invalidated ids) under the advisory lock.
+
+    Every replica invalidates the same ids; the one holding the lock regenerates them and
+    the rest reload when its faq_answers write is announced. A replica that didn't get the
+    lock checks again later in case the holder had already started on an older set.
+    """
+    while True:
+        ids = None if point_ids is None else [pid for pid in point_ids if pid in _pending]
+        if ids == []:
+            return None
+        async with async_engine.connect() as conn:
+            # autocommit, so the lock isn't held inside a transaction left open for minutes
+            conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+            if await conn.scalar(text(REFRESH_LOCK_SQL)):
+                try:
+                    return await precompute_faq_answers(ids)
+                finally:
+                    await conn.execute(text(REFRESH_UNLOCK_SQL))
+        if ids is None:
+            logging.info("FAQ answers are already being regenerated by another process")
+            return None
+        await asyncio.sleep(FAQ_REFRESH_RETRY_INTERVAL)
+
+def schedule_refresh(point_ids: Optional[Iterable[str]] = None):
+    task = asyncio.create_task(refresh_answers(None if point_ids is None else list(point_ids)))
+    _refresh_tasks.add(task)
+    task.add_done_callback(_refresh_tasks.discard)
+
+async def on_table_change(table: Optional[str]):
+    """db_events subscriber: drop answers built from the changed table (and have them regenerated)"""
+    if table is None or table == FaqAnswer.__tablename__:
+        # another process (the job or a replica) stored new answers. None means the listener
+        # reconnected: pick up answers stored meanwhile, but don't regenerate everything over a
+        # network blip; the next write to a source table still invalidates its answers
+        await load_faq_answers()
+        return
+
+    stale = [pid for pid, entry in _answers.items() if table in entry["tables"]]
+    if not stale:
+        return
+    now = datetime.now()
+    for pid in stale:
+        del _answers[pid]
+        _pending[pid] = now
+    stats["invalidated"] += len(stale)
+    logging.info(f"{len(stale)} FAQ answers invalidated by a change to {table}")
+    if FAQ_AUTO_REFRESH:
+        schedule_refresh(stale)
+
+def faq_stats() -> Dict:
+    return {**stats, "answers": len(_answers), "pending": len(_pending), "min_score": FAQ_MIN_SCORE}
+
+if __name__ == "__main__":
+    from backend.database import init_db
+
+    init_db()
+    print(asyncio.run(precompute_faq_answers()))
@@ -0,0 +1,90 @@
+# knowledge_base.py - Immutable in-memory snapshot of the Info table and its embeddings
+import asyncio
+import logging
+import os
+from dataclasses import dataclass
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import select
+
+from backend.database import AsyncSessionLocal, Info
+from backend.embedding_service import encode_cached
+
+# Rows scoring below this cosine similarity are not worth putting in the prompt
+KNOWLEDGE_MIN_SCORE = float(os.getenv("KNOWLEDGE_MIN_SCORE", "0.3"))
+
+@dataclass(frozen=True)
+class KnowledgeSnapshot:
+    version: int
+    lines: Tuple[str, ...]
+    embeddings: np.ndarray  # (rows, dim), L2-normalised, read-only
+    loaded_at: datetime
+
+    def top_k(self, query_vector, k: int, min_score: float = KNOWLEDGE_MIN_SCORE) -> List[str]:
+        """Formatted rows most similar to the query, best first"""
+        if not self.lines or k <= 0:
+            return []
+        query = np.asarray(query_vector, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm:
+            query = query / norm
+        scores = self.embeddings @ query
+        k = min(k, len(self.lines))
+        best = np.argpartition(-scores, k - 1)[:k]
+        best = best[np.argsort(-scores[best])]
+        return [self.lines[i] for i in best if scores[i] >= min_score]
+
+_snapshot: Optional[KnowledgeSnapshot] = None
+_refresh_lock: Optional[asyncio.Lock] = None
+
+def format_info_line(rec) -> str:
+    return f"- {rec.category.title()}: {rec.key} — {rec.value}"
+
+def get_snapshot() -> Optional[KnowledgeSnapshot]:
+    """Current snapshot, or None before the first load"""
+    return _snapshot
+
+async def refresh_snapshot() -> KnowledgeSnapshot:
+    """Reload the Info table, re-embed it and atomically swap the snapshot in"""
+    global _snapshot, _refresh_lock
+    if _refresh_lock is None:
+        _refresh_lock = asyncio.Lock()
+
+    async with _refresh_lock:
+        async with AsyncSessionLocal() as db:
+            records = (await db.execute(select(Info).order_by(Info.id))).scalars().all()
+        lines = tuple(format_info_line(rec) for rec in records)
+
+        if lines:
+            # unchanged rows come from the embedding store, only edited rows are re-encoded
+            embeddings = await asyncio.to_thread(encode_cached, list(lines), show_progress_bar=False)
+            norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+            embeddings = embeddings / np.where(norms == 0, 1, norms)
+        else:
+            embeddings = np.zeros((0, 0), dtype=np.float32)
+        embeddings.setflags(write=False)
+
+        version = _snapshot.version + 1 if _snapshot else 1
+        _snapshot = KnowledgeSnapshot(version=version, lines=lines, embeddings=embeddings, loaded_at=datetime.now())
+        logging.info(f"Knowledge snapshot v{version} loaded with {len(lines)} rows")
+        return _snapshot
+
+async def on_table_change(table: Optional[str]):
+    """db_events subscriber: reload when info changes (or when changes may have been missed)"""
+    if table is None or table == Info.__tablename__:
+        try:
+            await refresh_snapshot()
+        except Exception as e:
+            logging.error(f"Knowledge snapshot refresh failed: {e}")
+
+def snapshot_stats() -> dict:
+    if _snapshot is None:
+        return {"loaded": False}
+    return {
+        "loaded": True,
+        "version": _snapshot.version,
+        "rows": len(_snapshot.lines),
+        "loaded_at": _snapshot.loaded_at,
+    }
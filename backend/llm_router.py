@@ -0,0 +1,227 @@
+# llm_router.py - Hedged, first-token-wins routing between LLM providers
+#
+# The primary provider is started first. If it hasn't produced a first token within the
+# hedge delay (its recent p95 time-to-first-token, clamped), the next provider is started
+# as well; whichever yields a token first wins and the other call is cancelled. A provider
+# that fails before its first token hands over immediately. Recent error rate and latency
+# decide which provider is primary.
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+from typing import AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from backend.resilience import ProviderUnavailable
+
+LLM_HEDGE_ENABLED = os.getenv("LLM_HEDGE_ENABLED", "true").lower() == "true"
+# Hedge delay before there are enough samples, and the bounds the p95-based delay is kept in
+LLM_HEDGE_DELAY = float(os.getenv("LLM_HEDGE_DELAY", "2.0"))
+LLM_HEDGE_MIN_DELAY = float(os.getenv("LLM_HEDGE_MIN_DELAY", "0.5"))
+LLM_HEDGE_MAX_DELAY = float(os.getenv("LLM_HEDGE_MAX_DELAY", "5.0"))
+LLM_HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", "95"))
+LLM_HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
+# Only calls from the last LLM_STATS_WINDOW seconds count, so a demoted provider gets
+# promoted back once its failures age out
+LLM_STATS_WINDOW = float(os.getenv("LLM_STATS_WINDOW", "300"))
+LLM_STATS_MAX_SAMPLES = int(os.getenv("LLM_STATS_MAX_SAMPLES", "500"))
+# A provider is degraded above this error rate or p95 first-token latency (seconds)
+LLM_MAX_ERROR_RATE = float(os.getenv("LLM_MAX_ERROR_RATE", "0.2"))
+LLM_DEGRADED_P95 = float(os.getenv("LLM_DEGRADED_P95", "8.0"))
+
+# (prompt, history, database, query_vector) -> async iterator of text deltas
+StreamFactory = Callable[[str, Optional[List[Dict]], Optional[str], object], AsyncIterator[str]]
+
+class ProviderStats:
+    """Outcomes and first-token latencies of recent calls to one provider"""
+
+    def __init__(self, window: float = LLM_STATS_WINDOW, max_samples: int = LLM_STATS_MAX_SAMPLES):
+        self.window = window
+        self._outcomes = deque(maxlen=max_samples)  # (timestamp, ok)
+        self._latencies = deque(maxlen=max_samples)  # (timestamp, seconds to first token)
+        self.calls = 0
+        self.errors = 0
+        self.wins = 0
+        self.hedged = 0
+        self.cancelled = 0
+        self.slow_losses = 0
+
+    def _recent(self, samples: deque) -> list:
+        cutoff = time.monotonic() - self.window
+        while samples and samples[0][0] < cutoff:
+            samples.popleft()
+        return [value for _, value in samples]
+
+    def record_first_token(self, seconds: float):
+        now = time.monotonic()
+        self._latencies.append((now, seconds))
+        self._outcomes.append((now, True))
+
+    def record_error(self):
+        self.errors += 1
+        self._outcomes.append((time.monotonic(), False))
+
+    def record_cancelled(self, waited: float, hedge_delay: float):
+        """A cancelled call's wait is a lower bound on its first-token latency.
+
+        Past the hedge delay it is recorded as a slow failure, so a hung provider that
+        keeps losing to its hedge is demoted; a shorter wait says nothing and isn't recorded.
+        """
+        self.cancelled += 1
+        if waited < hedge_delay:
+            return
+        self.slow_losses += 1
+        now = time.monotonic()
+        self._latencies.append((now, waited))
+        self._outcomes.append((now, False))
+
+    def error_rate(self) -> float:
+        outcomes = self._recent(self._outcomes)
+        return outcomes.count(False) / len(outcomes) if outcomes else 0.0
+
+    def latency_percentile(self, q: float) -> Optional[float]:
+        latencies = self._recent(self._latencies)
+        if len(latencies) < LLM_HEDGE_MIN_SAMPLES:
+            return None
+        return float(np.percentile(latencies, q))
+
+    def degraded(self) -> bool:
+        p95 = self.latency_percentile(95)
+        return self.error_rate() > LLM_MAX_ERROR_RATE or (p95 is not None and p95 > LLM_DEGRADED_P95)
+
+    def summary(self) -> Dict:
+        p50 = self.latency_percentile(50)
+        p95 = self.latency_percentile(95)
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "wins": self.wins,
+            "hedged": self.hedged,
+            "cancelled": self.cancelled,
+            "slow_losses": self.slow_losses,
+            "recent_error_rate": round(self.error_rate(), 3),
+            "p50_first_token_s": round(p50, 3) if p50 is not None else None,
+            "p95_first_token_s": round(p95, 3) if p95 is not None else None,
+            "degraded": self.degraded(),
+        }
+
+class LLMRouter:
+    """Providers in preference order; the first healthy one is primary"""
+
+    def __init__(self, providers: Dict[str, StreamFactory], hedge: bool = LLM_HEDGE_ENABLED):
+        self.providers = providers
+        self.hedge = hedge
+        self.stats = {name: ProviderStats() for name in providers}
+
+    def ranked(self) -> List[str]:
+        """Healthy providers first, each group in preference order"""
+        names = list(self.providers)
+        return sorted(names, key=lambda name: (self.stats[name].degraded(), names.index(name)))
+
+    def hedge_delay(self, name: str) -> float:
+        p = self.stats[name].latency_percentile(LLM_HEDGE_PERCENTILE)
+        if p is None:
+            return LLM_HEDGE_DELAY
+        return min(max(p, LLM_HEDGE_MIN_DELAY), LLM_HEDGE_MAX_DELAY)
+
+    async def _first_token(self, name: str, args: tuple):
+        """Start a provider and wait for its first delta; None first means an empty answer"""
+        started = time.perf_counter()
+        stream = self.providers[name](*args).__aiter__()
+        try:
+            first = await stream.__anext__()
+        except StopAsyncIteration:
+            first = None
+        return stream, first, time.perf_counter() - started
+
+    async def stream(self, prompt: str, history: Optional[List[Dict]] = None, database: Optional[str] = None, query_vector=None) -> AsyncIterator[Tuple[str, str]]:
+        """Yield (provider, delta) from whichever provider answers first.
+
+        Raises once every provider has failed before its first token; a failure
+        after the first token propagates, since text has already been yielded.
+        """
+        args = (prompt, history, database, query_vector)
+        order = self.ranked()
+        pending: Dict[asyncio.Task, str] = {}
+        started_at: Dict[str, float] = {}
+        started = 0
+
+        def start_next(hedged: bool = False):
+            nonlocal started
+            name = order[started]
+            started += 1
+            self.stats[name].calls += 1
+            if hedged:
+                self.stats[name].hedged += 1
+                logging.info(f"Hedging LLM request to {name} after {self.hedge_delay(order[0]):.2f}s without a first token")
+            started_at[name] = time.perf_counter()
+            pending[asyncio.create_task(self._first_token(name, args))] = name
+
+        start_next()
+        winner = None
+        try:
+            while pending and winner is None:
+                can_hedge = self.hedge and started < len(order)
+                done, _ = await asyncio.wait(
+                    pending,
+                    timeout=self.hedge_delay(order[0]) if can_hedge else None,
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+                if not done:
+                    start_next(hedged=True)
+                    continue
+
+                for task in done:
+                    name = pending.pop(task)
+                    try:
+                        stream, first, latency = task.result()
+                    except ProviderUnavailable as e:
+                        logging.info(f"Skipping {e}")
+                        self.stats[name].record_error()
+                        continue
+                    except Exception as e:
+                        logging.error(f"{name} failed before its first token: {e!r}")
+                        self.stats[name].record_error()
+                        continue
+                    if winner is None:
+                        winner = (name, stream, first, latency)
+                    else:
+                        # both answered in the same tick: keep one, close the other
+                        await stream.aclose()
+
+                # fail over straight away rather than waiting out the hedge delay
+                if winner is None and not pending and started < len(order):
+                    start_next()
+        finally:
+            for task, name in pending.items():
+                task.cancel()
+                self.stats[name].record_cancelled(time.perf_counter() - started_at[name], self.hedge_delay(name))
+
+        if winner is None:
+            raise RuntimeError("All LLM providers failed")
+
+        name, stream, first, latency = winner
+        self.stats[name].wins += 1
+        self.stats[name].record_first_token(latency)
+        try:
+            yield name, first or ""
+            if first is None:
+                return
+            async for delta in stream:
+                yield name, delta
+        except Exception:
+            self.stats[name].record_error()
+            raise
+        finally:
+            await stream.aclose()
+
+    def get_stats(self) -> Dict:
+        order = self.ranked()
+        return {
+            "primary": order[0],
+            "hedge_enabled": self.hedge,
+            "hedge_delay_s": round(self.hedge_delay(order[0]), 3),
+            "providers": {name: stats.summary() for name, stats in self.stats.items()},
+        }
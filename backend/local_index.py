@@ -0,0 +1,119 @@
+# local_index.py - In-process vector index over the curated dataset (Qdrant fallback)
+#
+# Stored as two files next to each other:
+#   <path>.npy   float32 (points, dim) L2-normalised vectors, opened memory-mapped
+#   <path>.json  point ids and payloads in the same row order
+# Brute-force cosine search over ~100 points takes microseconds, so no ANN structure is needed.
+import json
+import logging
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+
+LOCAL_INDEX_PATH = os.getenv("LOCAL_INDEX_PATH", "data/uos_index")
+# Seconds between checks for a rebuilt (or newly built) index
+LOCAL_INDEX_CHECK_INTERVAL = float(os.getenv("LOCAL_INDEX_CHECK_INTERVAL", "10"))
+
+class LocalVectorIndex:
+    def __init__(self, vectors: np.ndarray, ids: List[str], payloads: List[Dict]):
+        self.vectors = vectors
+        self.ids = ids
+        self.payloads = payloads
+        self._langs = np.array([payload.get("lang", "") for payload in payloads])
+
+    @classmethod
+    def build(cls, ids: List[str], vectors, payloads: List[Dict]) -> "LocalVectorIndex":
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if len(vectors):
+            norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+            vectors = vectors / np.where(norms == 0, 1, norms)
+        return cls(vectors, list(ids), list(payloads))
+
+    def save(self, path: str = LOCAL_INDEX_PATH):
+        """Write both files to temporary names first so readers never see half an index"""
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(f"{path}.tmp.npy", "wb") as f:
+            np.save(f, self.vectors)
+        with open(f"{path}.tmp.json", "w", encoding="utf-8") as f:
+            json.dump({"ids": self.ids, "payloads": self.payloads}, f, ensure_ascii=False)
+        os.replace(f"{path}.tmp.npy", f"{path}.npy")
+        os.replace(f"{path}.tmp.json", f"{path}.json")
+
+    @classmethod
+    def load(cls, path: str = LOCAL_INDEX_PATH) -> "LocalVectorIndex":
+        vectors = np.load(f"{path}.npy", mmap_mode="r")
+        with open(f"{path}.json", encoding="utf-8") as f:
+            meta = json.load(f)
+        return cls(vectors, meta["ids"], meta["payloads"])
+
+    def search(self, vector, limit: int, score_threshold: Optional[float] = None, language: Optional[str] = None) -> List[Dict]:
+        """Cosine top-k as [{"id", "score", "payload"}], best first"""
+        if not self.ids:
+            return []
+        query = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm:
+            query = query / norm
+        scores = self.vectors @ query
+        if language:
+            scores = np.where(self._langs == language, scores, -np.inf)
+
+        limit = min(limit, len(self.ids))
+        best = np.argpartition(-scores, limit - 1)[:limit]
+        best = best[np.argsort(-scores[best])]
+        return [
+            {"id": self.ids[i], "score": float(scores[i]), "payload": self.payloads[i]}
+            for i in best
+            if np.isfinite(scores[i]) and (score_threshold is None or scores[i] >= score_threshold)
+        ]
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+_index: Optional[LocalVectorIndex] = None
+# mtime of the loaded <path>.json (written last by save), None while the files are missing
+_index_mtime: Optional[int] = None
+_checked_at = float("-inf")
+_index_lock = threading.Lock()
+
+def get_local_index() -> Optional[LocalVectorIndex]:
+    """Index from LOCAL_INDEX_PATH, reloaded when the builder rewrites it; None if it hasn't been built.
+
+    The file is stat'ed at most once every LOCAL_INDEX_CHECK_INTERVAL seconds, so a missing
+    index costs neither a disk hit nor a warning on every failed Qdrant call.
+    """
+    global _index, _index_mtime, _checked_at
+    if time.monotonic() - _checked_at < LOCAL_INDEX_CHECK_INTERVAL:
+        return _index
+    with _index_lock:
+        if time.monotonic() - _checked_at < LOCAL_INDEX_CHECK_INTERVAL:
+            return _index
+        first_check = _checked_at == float("-inf")
+        _checked_at = time.monotonic()
+        try:
+            mtime = os.stat(f"{LOCAL_INDEX_PATH}.json").st_mtime_ns
+        except FileNotFoundError:
+            mtime = None
+        if mtime == _index_mtime and not first_check:
+            return _index
+        if mtime is None:
+            # keep serving an index that was already loaded (its .npy stays memory-mapped)
+            if _index is None:
+                logging.warning(f"No local vector index at {LOCAL_INDEX_PATH}")
+            _index_mtime = None
+            return _index
+        try:
+            index = LocalVectorIndex.load(LOCAL_INDEX_PATH)
+        except (OSError, ValueError) as e:
+            # caught between the builder's two renames; retried on the next check
+            logging.warning(f"Local vector index at {LOCAL_INDEX_PATH} not loaded: {e}")
+            return _index
+        if len(index.vectors) != len(index):
+            logging.warning(f"Local vector index at {LOCAL_INDEX_PATH} is mid-rewrite, keeping the previous one")
+            return _index
+        _index, _index_mtime = index, mtime
+        logging.info(f"Local vector index loaded with {len(_index)} points")
+    return _index
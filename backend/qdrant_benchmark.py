@@ -0,0 +1,99 @@
+# qdrant_benchmark.py - Compare collection profiles on recall@k, answer accuracy and latency
+#
+# run from the repo root: python -m backend.qdrant_benchmark [--k 5] [--profiles default int8 ...] [--keep]
+#
+# Each profile is built into its own uos_bench_<profile> collection from the curated
+# dataset. Ground truth is an exact (brute-force) search, so recall@k measures what the
+# HNSW graph and quantization lose. Top-1 accuracy checks the best match still maps to
+# the same SQL command as the question being asked.
+import argparse
+import re
+import time
+
+import numpy as np
+from qdrant_client import models
+
+from backend.embedding_service import encode
+from backend.qdrant_builder import COLLECTION_PROFILES, clean_rows, qdrant_builder, qdrant_client
+from backend.qdrant_datasets import datasets
+from backend.qdrant_search import QDRANT_HNSW_EF, QDRANT_OVERSAMPLING
+
+def percentile(values, q) -> float:
+    return float(np.percentile(values, q)) if values else 0.0
+
+def make_queries(rows: list[dict]) -> list[dict]:
+    """Each curated question as asked, plus a lower-case, punctuation-free variant"""
+    queries = []
+    for row in rows:
+        queries.append({"text": row["questions"], "command": row["command"]})
+        casual = re.sub(r"[^\w\s]", "", row["questions"]).lower()
+        if casual != row["questions"]:
+            queries.append({"text": casual, "command": row["command"]})
+    return queries
+
+def search(collection_name: str, vector, k: int, exact: bool = False):
+    params = models.SearchParams(
+        exact=exact,
+        hnsw_ef=QDRANT_HNSW_EF,
+        quantization=models.QuantizationSearchParams(rescore=True, oversampling=QDRANT_OVERSAMPLING),
+    )
+    return qdrant_client.query_points(
+        collection_name=collection_name,
+        query=vector,
+        limit=k,
+        search_params=params,
+        with_payload=True,
+    ).points
+
+def benchmark_profile(profile: str, rows: list[dict], queries: list[dict], vectors, truth: list[set], k: int) -> dict:
+    collection_name = f"uos_bench_{profile}"
+    qdrant_builder(rows, incremental=False, collection_name=collection_name, profile=profile)
+
+    latencies = []
+    recalls = []
+    correct = 0
+    for query, vector, expected_ids in zip(queries, vectors, truth):
+        started = time.perf_counter()
+        points = search(collection_name, vector, k)
+        latencies.append((time.perf_counter() - started) * 1000)
+
+        recalls.append(len({str(point.id) for point in points} & expected_ids) / max(len(expected_ids), 1))
+        if points and points[0].payload.get("command") == query["command"]:
+            correct += 1
+
+    return {
+        "profile": profile,
+        f"recall@{k}": round(float(np.mean(recalls)), 4),
+        "top1_accuracy": round(correct / len(queries), 4),
+        "p50_ms": round(percentile(latencies, 50), 2),
+        "p99_ms": round(percentile(latencies, 99), 2),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Qdrant collection profiles")
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--profiles", nargs="+", default=list(COLLECTION_PROFILES), choices=list(COLLECTION_PROFILES))
+    parser.add_argument("--keep", action="store_true", help="keep the uos_bench_* collections afterwards")
+    args = parser.parse_args()
+
+    rows = clean_rows(datasets)
+    queries = make_queries(rows)
+    vectors = [vector.tolist() for vector in encode([query["text"] for query in queries], show_progress_bar=False)]
+
+    # exact search over unquantized float32 vectors is the reference
+    qdrant_builder(rows, incremental=False, collection_name="uos_bench_exact", profile="default")
+    truth = [{str(point.id) for point in search("uos_bench_exact", vector, args.k, exact=True)} for vector in vectors]
+
+    results = [benchmark_profile(profile, rows, queries, vectors, truth, args.k) for profile in args.profiles]
+
+    columns = list(results[0])
+    print(" | ".join(f"{column:>14}" for column in columns))
+    for result in results:
+        print(" | ".join(f"{str(result[column]):>14}" for column in columns))
+
+    if not args.keep:
+        for name in ["uos_bench_exact"] + [f"uos_bench_{profile}" for profile in args.profiles]:
+            qdrant_client.delete_collection(collection_name=name)
+
+if __name__ == "__main__":
+    main()
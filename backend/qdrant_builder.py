@@ -1,40 +1,203 @@
-from sentence_transformers import SentenceTransformer
 from qdrant_client import QdrantClient, models
 from qdrant_client.http.models import PointStruct
 from qdrant_client.http.models import VectorParams, Distance
+import hashlib
+import logging
+import os
+import time
 import uuid
-
-model = SentenceTransformer('paraphrase-multilingual-mpnet-base-v2')
+from backend.embedding_service import encode_cached
+from backend.local_index import LocalVectorIndex, LOCAL_INDEX_PATH
 
 qdrant_client = QdrantClient(url="http://localhost:6333")
 
 my_collection = "uos"
 
-def qdrant_builder(data: list[dict]) -> None:
-    if my_collection not in [col.name for col in qdrant_client.get_collections().collections]:
-        qdrant_client.recreate_collection(
-            collection_name=my_collection,
-            vectors_config=models.VectorParams(size=768, distance=models.Distance.COSINE),
-        )
+# Bulk ingestion tuning
+ENCODE_BATCH_SIZE = int(os.getenv("QDRANT_ENCODE_BATCH_SIZE", "128"))
+UPLOAD_BATCH_SIZE = int(os.getenv("QDRANT_UPLOAD_BATCH_SIZE", "256"))
+UPLOAD_PARALLEL = int(os.getenv("QDRANT_UPLOAD_PARALLEL", "2"))
+
+# Collection profiles trade memory and latency against recall; QDRANT_PROFILE picks one
+# (compare them with python -m backend.qdrant_benchmark)
+INT8_QUANTIZATION = models.ScalarQuantization(
+    scalar=models.ScalarQuantizationConfig(type=models.ScalarType.INT8, quantile=0.99, always_ram=True)
+)
+COLLECTION_PROFILES = {
+    "default": {},
+    "hnsw_compact": {"hnsw_config": models.HnswConfigDiff(m=8, ef_construct=64)},
+    "hnsw_accurate": {"hnsw_config": models.HnswConfigDiff(m=32, ef_construct=256)},
+    "int8": {"quantization_config": INT8_QUANTIZATION},
+    "int8_on_disk": {"quantization_config": INT8_QUANTIZATION, "on_disk": True},
+}
+QDRANT_PROFILE = os.getenv("QDRANT_PROFILE", "default")
+
+# Fixed namespace so the same row always maps to the same point id
+POINT_ID_NAMESPACE = uuid.UUID("6f1d2c1e-5b0a-4c8e-9a43-2f7e0d6b9c11")
 
+def flatten_datasets(data) -> list[dict]:
+    """Accept a flat list of rows or nested lists of rows (as in qdrant_datasets.py)"""
+    rows = []
     for item in data:
+        if isinstance(item, (list, tuple)):
+            rows.extend(flatten_datasets(item))
+        elif isinstance(item, dict):
+            rows.append(item)
+    return rows
+
+def clean_rows(data) -> list[dict]:
+    """Flatten, strip and drop rows without a question or command"""
+    rows = []
+    for item in flatten_datasets(data):
         question= item.get("questions", "").strip()
         command= item.get("command", "").strip()
         lang = item.get("lang", "").strip()
 
         if not question or not command:
             continue
-        
-        # Yohohohoho!!! Here is the fanci trick!!
-        qdrant_id = str(uuid.uuid4())
-
-        qdrant_client.upsert(
-            collection_name=my_collection,
-            points=[
-                models.PointStruct(
-                    id=qdrant_id,
-                    vector=model.encode(question).tolist(),
-                    payload={"command": command,"lang": lang, "questions": question}
-                )
-            ]
-        )
\ No newline at end of file
+        rows.append({"questions": question, "command": command, "lang": lang})
+    return rows
+
+def point_id(row: dict) -> str:
+    """Content-addressed id: a hash of (question, lang, command)"""
+    digest = hashlib.sha256("\x1f".join((row["questions"], row["lang"], row["command"])).encode()).hexdigest()
+    return str(uuid.uuid5(POINT_ID_NAMESPACE, digest))
+
+def existing_point_ids(collection_name: str = my_collection) -> set[str]:
+    """Ids currently stored in the collection (payloads and vectors are not fetched)"""
+    ids = set()
+    offset = None
+    while True:
+        points, offset = qdrant_client.scroll(
+            collection_name=collection_name,
+            limit=1000,
+            offset=offset,
+            with_payload=False,
+            with_vectors=False,
+        )
+        ids.update(str(point.id) for point in points)
+        if offset is None:
+            return ids
+
+def export_local_index(collection_name: str = my_collection, path: str = LOCAL_INDEX_PATH) -> int:
+    """Copy the collection's vectors and payloads into the local fallback index"""
+    ids, vectors, payloads = [], [], []
+    offset = None
+    while True:
+        points, offset = qdrant_client.scroll(
+            collection_name=collection_name,
+            limit=1000,
+            offset=offset,
+            with_payload=True,
+            with_vectors=True,
+        )
+        for point in points:
+            ids.append(str(point.id))
+            vectors.append(point.vector)
+            payloads.append(point.payload)
+        if offset is None:
+            break
+    LocalVectorIndex.build(ids, vectors, payloads).save(path)
+    return len(ids)
+
+def build_local_index(data: list, path: str = LOCAL_INDEX_PATH) -> int:
+    """Build the local index straight from the dataset, without a Qdrant server"""
+    rows_by_id = {point_id(row): row for row in clean_rows(data)}
+    vectors = encode_cached([row["questions"] for row in rows_by_id.values()], batch_size=ENCODE_BATCH_SIZE, show_progress_bar=False)
+    LocalVectorIndex.build(list(rows_by_id), vectors, list(rows_by_id.values())).save(path)
+    logging.info(f"Local vector index built with {len(rows_by_id)} points at {path}")
+    return len(rows_by_id)
+
+def ensure_collection(collection_name: str = my_collection, profile: str = QDRANT_PROFILE) -> None:
+    """Create the collection with the profile's storage settings if it doesn't exist.
+
+    Profiles only apply at creation; switching profile needs a full rebuild
+    into a fresh collection.
+    """
+    settings = COLLECTION_PROFILES[profile]
+    if collection_name not in [col.name for col in qdrant_client.get_collections().collections]:
+        qdrant_client.create_collection(
+            collection_name=collection_name,
+            vectors_config=models.VectorParams(
+                size=768,
+                distance=models.Distance.COSINE,
+                on_disk=settings.get("on_disk"),
+            ),
+            hnsw_config=settings.get("hnsw_config"),
+            quantization_config=settings.get("quantization_config"),
+        )
+    # keyword index so language-filtered searches only visit that language's points
+    qdrant_client.create_payload_index(
+        collection_name=collection_name,
+        field_name="lang",
+        field_schema=models.PayloadSchemaType.KEYWORD,
+        wait=True,
+    )
+
+def qdrant_builder(data: list, incremental: bool = True, collection_name: str = my_collection, profile: str = QDRANT_PROFILE, local_index_path: str = None) -> dict:
+    """Sync the collection with the dataset.
+
+    Incremental mode only embeds and uploads rows whose id isn't stored yet;
+    a full run re-embeds everything. Both delete points no longer in the dataset.
+    The main collection is also exported to the local fallback index.
+    """
+    if local_index_path is None and collection_name == my_collection:
+        local_index_path = LOCAL_INDEX_PATH
+    ensure_collection(collection_name, profile)
+
+    # Duplicate rows collapse onto the same id
+    rows_by_id = {point_id(row): row for row in clean_rows(data)}
+    stored_ids = existing_point_ids(collection_name)
+
+    stale_ids = stored_ids - rows_by_id.keys()
+    if incremental:
+        new_ids = [pid for pid in rows_by_id if pid not in stored_ids]
+    else:
+        new_ids = list(rows_by_id)
+
+    started = time.perf_counter()
+    if new_ids:
+        # a full rebuild re-uploads every point but only embeds questions the store hasn't seen
+        vectors = encode_cached(
+            [rows_by_id[pid]["questions"] for pid in new_ids],
+            batch_size=ENCODE_BATCH_SIZE,
+            show_progress_bar=False,
+        )
+    encoded = time.perf_counter()
+
+    if new_ids:
+        points = [
+            models.PointStruct(id=pid, vector=vector.tolist(), payload=rows_by_id[pid])
+            for pid, vector in zip(new_ids, vectors)
+        ]
+        qdrant_client.upload_points(
+            collection_name=collection_name,
+            points=points,
+            batch_size=UPLOAD_BATCH_SIZE,
+            parallel=UPLOAD_PARALLEL,
+            wait=True,
+        )
+    if stale_ids:
+        qdrant_client.delete(
+            collection_name=collection_name,
+            points_selector=models.PointIdsList(points=list(stale_ids)),
+            wait=True,
+        )
+    finished = time.perf_counter()
+
+    total = finished - started
+    stats = {
+        "mode": "incremental" if incremental else "full",
+        "points": len(rows_by_id),
+        "upserted": len(new_ids),
+        "deleted": len(stale_ids),
+        "unchanged": len(rows_by_id) - len(new_ids) if incremental else 0,
+        "encode_seconds": round(encoded - started, 3),
+        "upload_seconds": round(finished - encoded, 3),
+        "points_per_second": round(len(new_ids) / total, 1) if new_ids and total else None,
+    }
+    if local_index_path:
+        stats["local_index_points"] = export_local_index(collection_name, local_index_path)
+
+    logging.info(f"qdrant_builder: {stats['mode']} sync upserted {stats['upserted']}, deleted {stats['deleted']}, unchanged {stats['unchanged']} in {total:.2f}s ({stats['points_per_second']} points/s)")
+    return stats
@@ -1,4 +1,4 @@
-from qdrant_builder import qdrant_builder
+from backend.qdrant_builder import qdrant_builder, build_local_index
 
 datasets = [
 [
@@ -485,4 +485,10 @@ datasets = [
 ]
 ]
 
-qdrant_builder(datasets)
\ No newline at end of file
+# run from the repo root: python -m backend.qdrant_datasets [--full | --local-only]
+if __name__ == "__main__":
+    import sys
+    if "--local-only" in sys.argv:
+        print({"local_index_points": build_local_index(datasets)})
+    else:
+        print(qdrant_builder(datasets, incremental="--full" not in sys.argv))
@@ -1,34 +1,174 @@
-from qdrant_client import QdrantClient
-from sentence_transformers import SentenceTransformer
+from qdrant_client import AsyncQdrantClient, models
+from dotenv import load_dotenv
+import asyncio
+import logging
 import warnings
-import psycopg2
+import os
+from backend.embedding_service import encode_query
+from backend.database import async_engine
+from backend.sql_cache import get_cached_result, cache_result
+from backend.local_index import get_local_index
 
 warnings.filterwarnings("ignore", category=DeprecationWarning)
 
+load_dotenv()
 
-model = SentenceTransformer("paraphrase-multilingual-mpnet-base-v2")
-qdrant_client = QdrantClient(url="http://localhost:6333")
+# Per-stage timeouts (seconds) for the retrieval pipeline
+EMBED_TIMEOUT = float(os.getenv("EMBED_TIMEOUT", "5"))
+QDRANT_TIMEOUT = float(os.getenv("QDRANT_TIMEOUT", "3"))
+SQL_TIMEOUT = float(os.getenv("SQL_TIMEOUT", "3"))
+
+# Retrieval: candidates fetched, minimum cosine score, distinct commands executed and rows kept per command
+QDRANT_TOP_K = int(os.getenv("QDRANT_TOP_K", "5"))
+QDRANT_SCORE_THRESHOLD = float(os.getenv("QDRANT_SCORE_THRESHOLD", "0.6"))
+QDRANT_MAX_COMMANDS = int(os.getenv("QDRANT_MAX_COMMANDS", "2"))
+QDRANT_MAX_ROWS = int(os.getenv("QDRANT_MAX_ROWS", "20"))
+# Search-time knobs: HNSW beam width and, for quantized profiles, oversampling before rescoring
+# with the original vectors (ignored by collections without quantization)
+QDRANT_HNSW_EF = int(os.getenv("QDRANT_HNSW_EF", "128"))
+QDRANT_OVERSAMPLING = float(os.getenv("QDRANT_OVERSAMPLING", "2.0"))
+SEARCH_PARAMS = models.SearchParams(
+    hnsw_ef=QDRANT_HNSW_EF,
+    quantization=models.QuantizationSearchParams(rescore=True, oversampling=QDRANT_OVERSAMPLING),
+)
+# A language-filtered search whose best score is below this is retried over the whole collection
+QDRANT_LANG_FALLBACK_SCORE = float(os.getenv("QDRANT_LANG_FALLBACK_SCORE", "0.75"))
+
+# "qdrant" searches the server and falls back to the local index when it fails;
+# "local" serves every search from the local index (no Qdrant deployment needed)
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "qdrant")
+
+qdrant_client = AsyncQdrantClient(url="http://localhost:6333")
 collection_name = "uos"
+local_fallbacks = 0
 
-def qdrant_search(question):
-    results = qdrant_client.search(
-        collection_name=collection_name,
-        query_vector=model.encode(question).tolist(),
-        limit=1,
-        with_payload=True,
-    )
+async def embed_query(question):
+    # concurrent questions are encoded together by the micro-batcher
+    return await asyncio.wait_for(encode_query(question), timeout=EMBED_TIMEOUT)
 
-    conn = psycopg2.connect(
-    host="POSTGRES_HOST",
-    database="POSTGRES_DB",
-    user="POSTGRES_USER",
-    password="POSTGRES_PASSWORD",
+def search_local(vector, top_k, score_threshold, language=None):
+    index = get_local_index()
+    if index is None:
+        raise RuntimeError("local vector index has not been built")
+    return index.search(vector, top_k, score_threshold, language)
+
+async def search_points(vector, top_k, score_threshold, language=None):
+    """Matches as [{"id", "score", "payload"}], best first"""
+    global local_fallbacks
+    if VECTOR_BACKEND == "local":
+        return search_local(vector, top_k, score_threshold, language)
+    try:
+        return await search_qdrant(vector, top_k, score_threshold, language)
+    except Exception as e:
+        if get_local_index() is None:
+            raise
+        local_fallbacks += 1
+        logging.warning(f"Qdrant search failed ({e!r}), using the local index")
+        return search_local(vector, top_k, score_threshold, language)
+
+async def search_qdrant(vector, top_k, score_threshold, language=None):
+    query_filter = None
+    if language:
+        query_filter = models.Filter(must=[models.FieldCondition(key="lang", match=models.MatchValue(value=language))])
+    response = await asyncio.wait_for(
+        qdrant_client.query_points(
+            collection_name=collection_name,
+            query=vector.tolist(),
+            query_filter=query_filter,
+            search_params=SEARCH_PARAMS,
+            limit=top_k,
+            score_threshold=score_threshold,
+            with_payload=True,
+        ),
+        timeout=QDRANT_TIMEOUT,
     )
+    return [{"id": str(point.id), "score": point.score, "payload": point.payload} for point in response.points]
+
+def get_vector_search_stats() -> dict:
+    index = get_local_index()
+    return {
+        "backend": VECTOR_BACKEND,
+        "local_index_points": len(index) if index is not None else None,
+        "local_fallbacks": local_fallbacks,
+    }
+
+async def search_candidates(vector, language=None, top_k=QDRANT_TOP_K, score_threshold=QDRANT_SCORE_THRESHOLD):
+    """Top-k points above the score threshold as [{"id", "score", "payload"}], best first.
+
+    With a language ("en"/"ku") only points of that language are searched,
+    falling back to the whole collection when the best filtered score is low.
+    """
+    points = []
+    if language:
+        points = await search_points(vector, top_k, score_threshold, language)
+    if not points or points[0]["score"] < QDRANT_LANG_FALLBACK_SCORE:
+        points = await search_points(vector, top_k, score_threshold)
+    return points
+
+async def qdrant_retrieve(question, vector=None, language=None, top_k=QDRANT_TOP_K, score_threshold=QDRANT_SCORE_THRESHOLD, max_commands=QDRANT_MAX_COMMANDS, points=None):
+    """Top-k matches above the score threshold, with their commands executed concurrently.
+
+    Returns [{"question", "score", "command", "rows": [{column: value}]}], best first.
+    An empty list means the question is off-topic for the university database.
+    Callers that already ran search_candidates pass its points in.
+    """
+    if points is None:
+        # callers that already embedded the question (e.g. for the semantic cache) pass the vector in
+        if vector is None:
+            vector = await embed_query(question)
+        points = await search_candidates(vector, language, top_k, score_threshold)
+
+    # en/ku paraphrases share a command, keep the best-scoring match per command
+    matches = []
+    seen_commands = set()
+    for point in points:
+        psql = point["payload"].get("command", "").strip()
+        if not psql or psql in seen_commands:
+            continue
+        seen_commands.add(psql)
+        matches.append({"question": point["payload"].get("questions", ""), "score": point["score"], "command": psql})
+        if len(matches) >= max_commands:
+            break
+
+    results = await asyncio.gather(*(run_cached_command(match["command"]) for match in matches), return_exceptions=True)
+    hits = []
+    for match, rows in zip(matches, results):
+        if isinstance(rows, Exception):
+            logging.error(f"Command failed for '{match['question']}': {rows!r}")
+            continue
+        hits.append({**match, "rows": rows})
+    return hits
+
+def format_database_context(hits) -> str:
+    """Render retrieved rows as plain text for the LLM prompt"""
+    sections = []
+    for hit in hits:
+        lines = [f"Matched question: {hit['question']}"]
+        for row in hit["rows"]:
+            lines.append(", ".join(f"{column}: {value}" for column, value in row.items()))
+        if not hit["rows"]:
+            lines.append("No rows found.")
+        sections.append("\n".join(lines))
+    return "\n\n".join(sections)
+
+async def qdrant_search(question, vector=None, language=None, points=None):
+    """Database context for the prompt, or None for off-topic questions"""
+    hits = await qdrant_retrieve(question, vector, language, points=points)
+    if not hits:
+        return None
+    return format_database_context(hits)
+
+async def run_cached_command(psql):
+    hit, rows = get_cached_result(psql)
+    if hit:
+        return rows
 
-    psql = results[0].payload.get("command", "").strip()
-    with conn.cursor() as cursor:
-        cursor.execute(psql)
-        database = cursor.fetchone()[0]
-    return database
+    rows = await asyncio.wait_for(run_command(psql), timeout=SQL_TIMEOUT)
+    cache_result(psql, rows)
+    return rows
 
-qdrant_search()
\ No newline at end of file
+async def run_command(psql):
+    # pooled connection; exec_driver_sql so literals like '15:00:00' aren't read as bind params
+    async with async_engine.connect() as conn:
+        result = await conn.exec_driver_sql(psql)
+        return [dict(row) for row in result.mappings().fetchmany(QDRANT_MAX_ROWS)]
@@ -0,0 +1,171 @@
+# resilience.py - Per-provider circuit breakers and adaptive (AIMD) concurrency limits
+#
+# A guarded provider call is refused up front, with ProviderUnavailable, when the
+# provider's breaker is open or its in-flight calls are at the current limit. The router
+# then moves to the next provider without waiting on a call that is bound to fail or queue.
+import logging
+import os
+import time
+from typing import AsyncIterator, Callable, Dict, Optional
+
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5"))
+CIRCUIT_RESET_TIMEOUT = float(os.getenv("CIRCUIT_RESET_TIMEOUT", "30"))
+CIRCUIT_HALF_OPEN_CALLS = int(os.getenv("CIRCUIT_HALF_OPEN_CALLS", "1"))
+
+LLM_CONCURRENCY_INITIAL = float(os.getenv("LLM_CONCURRENCY_INITIAL", "16"))
+LLM_CONCURRENCY_MIN = float(os.getenv("LLM_CONCURRENCY_MIN", "2"))
+LLM_CONCURRENCY_MAX = float(os.getenv("LLM_CONCURRENCY_MAX", "64"))
+# First-token latency (seconds) above which the limit shrinks instead of growing
+LLM_LATENCY_TARGET = float(os.getenv("LLM_LATENCY_TARGET", "3.0"))
+
+# Status codes that mean "slow down": rate limited, unavailable, overloaded (Anthropic)
+OVERLOAD_STATUS_CODES = {429, 503, 529}
+
+class ProviderUnavailable(Exception):
+    """Raised instead of calling a provider whose breaker is open or limit is reached"""
+
+def is_overload(exc: BaseException) -> bool:
+    """Rate limits, overload responses and timeouts (works for both SDKs' status errors)"""
+    if isinstance(exc, TimeoutError):
+        return True
+    return getattr(exc, "status_code", None) in OVERLOAD_STATUS_CODES
+
+class CircuitBreaker:
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = CIRCUIT_FAILURE_THRESHOLD, reset_timeout: float = CIRCUIT_RESET_TIMEOUT, half_open_calls: int = CIRCUIT_HALF_OPEN_CALLS):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.half_open_calls = half_open_calls
+        self._state = self.CLOSED
+        self._opened_at = 0.0
+        self._probes = 0
+        self.failures = 0
+        self.opened = 0
+        self.rejected = 0
+
+    @property
+    def state(self) -> str:
+        if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+            self._state = self.HALF_OPEN
+            self._probes = 0
+        return self._state
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == self.CLOSED:
+            return True
+        if state == self.HALF_OPEN and self._probes < self.half_open_calls:
+            self._probes += 1
+            return True
+        self.rejected += 1
+        return False
+
+    def record_success(self):
+        self.failures = 0
+        self._state = self.CLOSED
+
+    def record_failure(self, overloaded: bool = False):
+        """Rate limits open the breaker at once; other errors after failure_threshold in a row"""
+        self.failures += 1
+        if self.state == self.HALF_OPEN or overloaded or self.failures >= self.failure_threshold:
+            if self._state != self.OPEN:
+                self.opened += 1
+            self._state = self.OPEN
+            self._opened_at = time.monotonic()
+
+    def record_cancel(self):
+        """A call that ended without an outcome (e.g. a cancelled hedge) frees its probe slot"""
+        if self._state == self.HALF_OPEN and self._probes:
+            self._probes -= 1
+
+    def stats(self) -> Dict:
+        return {"state": self.state, "consecutive_failures": self.failures, "opened": self.opened, "rejected": self.rejected}
+
+class AdaptiveLimiter:
+    """AIMD concurrency limit: +1/limit per healthy call, cut on overload or slow first tokens"""
+
+    def __init__(self, initial: float = LLM_CONCURRENCY_INITIAL, min_limit: float = LLM_CONCURRENCY_MIN, max_limit: float = LLM_CONCURRENCY_MAX, latency_target: float = LLM_LATENCY_TARGET):
+        self.limit = initial
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.latency_target = latency_target
+        self.in_flight = 0
+        self.rejected = 0
+
+    def try_acquire(self) -> bool:
+        if self.in_flight >= int(self.limit):
+            self.rejected += 1
+            return False
+        self.in_flight += 1
+        return True
+
+    def release(self, latency: Optional[float], overloaded: bool = False, censored: bool = False):
+        """censored: latency is only a lower bound (cancelled while waiting), so it can
+        shrink the limit once it is already over the target but never grow it"""
+        self.in_flight -= 1
+        if overloaded:
+            self.limit = max(self.min_limit, self.limit / 2)
+        elif latency is None:
+            return
+        elif latency > self.latency_target:
+            self.limit = max(self.min_limit, self.limit * 0.9)
+        elif not censored:
+            self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+
+    def stats(self) -> Dict:
+        return {"limit": round(self.limit, 2), "in_flight": self.in_flight, "rejected": self.rejected}
+
+class ProviderGuard:
+    def __init__(self, name: str):
+        self.name = name
+        self.breaker = CircuitBreaker()
+        self.limiter = AdaptiveLimiter()
+
+    def wrap(self, factory: Callable[..., AsyncIterator[str]]) -> Callable[..., AsyncIterator[str]]:
+        """Guard a streaming provider call; the slot is held until the stream ends"""
+        async def guarded(*args) -> AsyncIterator[str]:
+            if not self.breaker.allow():
+                raise ProviderUnavailable(f"{self.name} circuit is open")
+            if not self.limiter.try_acquire():
+                self.breaker.record_cancel()
+                raise ProviderUnavailable(f"{self.name} is at its concurrency limit ({int(self.limiter.limit)})")
+
+            started = time.perf_counter()
+            first_token = None
+            outcome = None
+            overloaded = False
+            try:
+                async for delta in factory(*args):
+                    if first_token is None:
+                        first_token = time.perf_counter() - started
+                    yield delta
+                outcome = "ok"
+            except Exception as e:
+                outcome = "error"
+                overloaded = is_overload(e)
+                self.breaker.record_failure(overloaded)
+                if overloaded:
+                    logging.warning(f"{self.name} overloaded ({e!r}), concurrency limit and breaker backing off")
+                raise
+            finally:
+                if outcome == "ok":
+                    self.breaker.record_success()
+                elif outcome is None:
+                    self.breaker.record_cancel()
+                censored = first_token is None and outcome is None
+                if first_token is not None:
+                    latency = first_token
+                elif censored:
+                    # cancelled while still waiting: how long it waited is a lower bound
+                    latency = time.perf_counter() - started
+                else:
+                    latency = None
+                self.limiter.release(latency, overloaded, censored)
+
+        return guarded
+
+    def stats(self) -> Dict:
+        return {"circuit": self.breaker.stats(), "concurrency": self.limiter.stats()}
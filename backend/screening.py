@@ -0,0 +1,86 @@
+# screening.py - Precompiled injection/abuse screening shared by the request validators
+#
+# Every rule carries the literals its pattern cannot match without. A message is first
+# checked for those literals with plain substring tests (one fast pass over the
+# deduplicated set), and only rules whose literals are present run their precompiled
+# regex, in the original order, so the reported threat type is the same as the old
+# per-request loops. Clean messages, the common case, never touch the regex engine.
+import re
+from typing import Callable, List, Optional, Tuple
+
+SQL_KEYWORDS = ("drop", "delete", "insert", "update", "alter", "create", "exec", "union", "select")
+
+# (pattern, threat type, literals the pattern needs), matched against the lower-cased text
+SQL_RULES = [
+    (r"('|(\\'))", "SQL_QUOTES", ("'",)),
+    (r"(;|\s)(drop|delete|insert|update|alter|create|exec|union|select)\s", "SQL_KEYWORDS", SQL_KEYWORDS),
+    (r"(union\s+(all\s+)?select)", "SQL_UNION", ("union",)),
+    (r"(or\s+.+=.+)", "SQL_OR_CONDITION", ("=",)),
+    (r"(and\s+.+=.+)", "SQL_AND_CONDITION", ("=",)),
+    (r"(--|\/\*|\*\/)", "SQL_COMMENTS", ("--", "/*", "*/")),
+]
+
+QUERY_RULES = SQL_RULES + [
+    (r"\b(database|table|column|schema|version|postgresql|mysql|sqlite)\b", "INFO_DISCLOSURE", ("database", "table", "column", "schema", "version", "sql")),
+    (r"\b(admin|password|user|login|auth|token)\b.*\b(access|show|display|get|list)\b", "PRIVILEGE_REQUEST", ("admin", "password", "user", "login", "auth", "token")),
+    (r"\b(show|list|display|execute|run|query)\s+(table|database|schema|structure)", "SYSTEM_QUERY", ("table", "database", "schema", "structure")),
+    (r"\bselect\s+.*\bfrom\b", "SELECT_STATEMENT", ("select",)),
+]
+
+# Admin-entered Info fields, matched against the upper-cased text
+FIELD_RULES = [
+    (r'(\b(DROP|DELETE|INSERT|UPDATE|ALTER|CREATE|EXEC|EXECUTE|UNION|SELECT)\b)', "SQL_KEYWORDS", tuple(word.upper() for word in SQL_KEYWORDS)),
+    (r'(--|;|\*|\/\*|\*\/)', "SQL_SYMBOLS", ("-", ";", "*", "/")),
+    (r'(\bOR\b.*=.*\b|\bAND\b.*=.*)', "SQL_CONDITION", ("=",)),
+    (r"('|(\\'))", "SQL_QUOTES", ("'",)),
+]
+
+class Screener:
+    """Ordered (pattern, threat type, required literals) rules, compiled once"""
+
+    def __init__(self, rules: List[Tuple[str, str, Tuple[str, ...]]], fold: Callable[[str], str] = str.lower):
+        self.fold = fold
+        self.rules = [(re.compile(pattern), threat_type, frozenset(literals)) for pattern, threat_type, literals in rules]
+        self.literals = tuple(sorted({literal for _, _, literals in rules for literal in literals}))
+
+    def screen(self, text: str) -> Optional[str]:
+        """First matching threat type, or None for clean text"""
+        text = self.fold(text)
+        present = {literal for literal in self.literals if literal in text}
+        if not present:
+            return None
+        for pattern, threat_type, literals in self.rules:
+            if not literals.isdisjoint(present) and pattern.search(text):
+                return threat_type
+        return None
+
+query_screener = Screener(QUERY_RULES)
+message_screener = Screener(SQL_RULES)
+field_screener = Screener(FIELD_RULES, fold=str.upper)
+
+# run from the repo root: python -m backend.screening
+if __name__ == "__main__":
+    import timeit
+
+    messages = [
+        "When does the library of the College of Engineering open on Saturdays?",
+        "Who is the dean of the College of Science and what are the admission requirements?",
+        "کێ ڕاگری کۆلێژی ئەندازیارییە و کتێبخانەکە کەی دەکرێتەوە؟",
+        "Tell me about the computer engineering department " * 8,
+        "' OR 1=1 --",
+    ]
+
+    def per_request_loop(message):
+        # what the validators did before: compile lookups and a search per pattern
+        message_lower = message.lower()
+        for pattern, threat_type, _ in QUERY_RULES:
+            if re.search(pattern, message_lower):
+                return threat_type
+        return None
+
+    runs = 20000
+    for message in messages:
+        assert per_request_loop(message) == query_screener.screen(message)
+        before = timeit.timeit(lambda: per_request_loop(message), number=runs) / runs * 1e6
+        after = timeit.timeit(lambda: query_screener.screen(message), number=runs) / runs * 1e6
+        print(f"{len(message):>4} chars  loop {before:6.2f} us  screener {after:6.2f} us  -> {query_screener.screen(message)}")
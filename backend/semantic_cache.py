@@ -0,0 +1,110 @@
+# semantic_cache.py - Answers reused for paraphrased questions, matched on query embeddings
+import os
+import threading
+import time
+from typing import Dict, Optional
+
+import numpy as np
+
+# Cosine similarity a cached question must reach to be served, per language
+SEMANTIC_CACHE_THRESHOLDS = {
+    "en": float(os.getenv("SEMANTIC_CACHE_THRESHOLD_EN", "0.92")),
+    "ku": float(os.getenv("SEMANTIC_CACHE_THRESHOLD_KU", "0.94")),
+}
+SEMANTIC_CACHE_MAX_ENTRIES = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "2000"))
+SEMANTIC_CACHE_TTL = float(os.getenv("SEMANTIC_CACHE_TTL", "21600"))
+
+class SemanticCache:
+    """Per-language ring buffer of normalised question vectors and their answers.
+
+    Lookups are one matrix-vector product over at most max_entries rows.
+    """
+
+    def __init__(self, thresholds: Dict[str, float] = SEMANTIC_CACHE_THRESHOLDS, max_entries: int = SEMANTIC_CACHE_MAX_ENTRIES, ttl: float = SEMANTIC_CACHE_TTL):
+        self.thresholds = thresholds
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._vectors: Dict[str, np.ndarray] = {}
+        self._entries: Dict[str, list] = {}
+        self._next_slot: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.purged = 0
+
+    @staticmethod
+    def _normalize(vector) -> np.ndarray:
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def lookup(self, vector, language: str) -> Optional[Dict]:
+        """Best cached answer at or above the language threshold, or None"""
+        with self._lock:
+            vectors = self._vectors.get(language)
+            if vectors is None:
+                self.misses += 1
+                return None
+
+            scores = vectors @ self._normalize(vector)
+            slot = int(np.argmax(scores))
+            score = float(scores[slot])
+            entry = self._entries[language][slot]
+            threshold = self.thresholds.get(language, self.thresholds["en"])
+            if entry is None or score < threshold:
+                self.misses += 1
+                return None
+            if entry["expires"] <= time.monotonic():
+                self._clear_slot(language, slot)
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            return {"question": entry["question"], "answer": entry["answer"], "score": score}
+
+    def add(self, vector, language: str, question: str, answer: str):
+        vector = self._normalize(vector)
+        with self._lock:
+            if language not in self._vectors:
+                self._vectors[language] = np.zeros((self.max_entries, vector.shape[0]), dtype=np.float32)
+                self._entries[language] = [None] * self.max_entries
+                self._next_slot[language] = 0
+
+            # overwrite the oldest slot once full
+            slot = self._next_slot[language]
+            self._vectors[language][slot] = vector
+            self._entries[language][slot] = {
+                "question": question,
+                "answer": answer,
+                "expires": time.monotonic() + self.ttl,
+            }
+            self._next_slot[language] = (slot + 1) % self.max_entries
+
+    def purge(self, language: Optional[str] = None) -> int:
+        """Drop every entry, or only one language's"""
+        with self._lock:
+            languages = [language] if language else list(self._vectors)
+            removed = 0
+            for lang in languages:
+                if lang in self._entries:
+                    removed += sum(1 for entry in self._entries[lang] if entry is not None)
+                    del self._vectors[lang], self._entries[lang], self._next_slot[lang]
+            self.purged += removed
+            return removed
+
+    def _clear_slot(self, language: str, slot: int):
+        self._vectors[language][slot] = 0
+        self._entries[language][slot] = None
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": {lang: sum(1 for entry in entries if entry is not None) for lang, entries in self._entries.items()},
+            "thresholds": self.thresholds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "purged": self.purged,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0,
+        }
+
+semantic_cache = SemanticCache()
@@ -0,0 +1,83 @@
+# single_flight.py - Coalesce identical in-flight requests onto one upstream call
+#
+# The first request for a key (the leader) starts the upstream stream in a background task;
+# concurrent requests for the same key subscribe to it and replay every item from the
+# start. The upstream call runs to completion even if its subscribers disconnect, so the
+# answer still reaches the response cache.
+import asyncio
+import logging
+from typing import AsyncIterator, Callable, Dict, List, Optional
+
+class Flight:
+    def __init__(self):
+        self.items: List = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.subscribers = 1
+        self.task: Optional[asyncio.Task] = None
+        self._changed = asyncio.Event()
+
+    def notify(self):
+        # wake everyone waiting on the current event, later waiters get a fresh one
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def wait(self):
+        await self._changed.wait()
+
+class SingleFlight:
+    def __init__(self):
+        self._flights: Dict[str, Flight] = {}
+        self.leaders = 0
+        self.coalesced = 0
+
+    async def stream(self, key: str, factory: Callable[[], AsyncIterator]) -> AsyncIterator:
+        """Items of factory()'s stream, shared with every concurrent caller using the same key"""
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = Flight()
+            self._flights[key] = flight
+            self.leaders += 1
+            flight.task = asyncio.create_task(self._run(key, flight, factory))
+        else:
+            flight.subscribers += 1
+            self.coalesced += 1
+            logging.info(f"Coalesced request onto in-flight call ({flight.subscribers} waiting)")
+
+        index = 0
+        try:
+            while True:
+                while index < len(flight.items):
+                    yield flight.items[index]
+                    index += 1
+                if flight.done:
+                    if flight.error is not None:
+                        raise flight.error
+                    return
+                await flight.wait()
+        finally:
+            # finished or disconnected; the upstream call carries on either way
+            flight.subscribers -= 1
+
+    async def _run(self, key: str, flight: Flight, factory: Callable[[], AsyncIterator]):
+        try:
+            async for item in factory():
+                flight.items.append(item)
+                flight.notify()
+        except Exception as e:
+            flight.error = e
+        finally:
+            flight.done = True
+            # later requests start a new flight (and normally hit the response cache)
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+            flight.notify()
+
+    def stats(self) -> Dict:
+        total = self.leaders + self.coalesced
+        return {
+            "upstream_calls": self.leaders,
+            "coalesced": self.coalesced,
+            "in_flight": len(self._flights),
+            "coalesced_share": round(self.coalesced / total, 3) if total else 0,
+        }
@@ -0,0 +1,56 @@
+# sql_cache.py - Results of the read-only commands stored in the uos collection
+import logging
+import os
+import re
+from typing import Any, Dict, Optional, Set, Tuple
+
+from backend.cache import LRUCache
+
+SQL_CACHE_TTL = float(os.getenv("SQL_CACHE_TTL", "600"))
+SQL_CACHE_MAX_ENTRIES = int(os.getenv("SQL_CACHE_MAX_ENTRIES", "1000"))
+
+_TABLE_PATTERN = re.compile(r"\b(?:from|join)\s+([a-z_][a-z0-9_]*)", re.IGNORECASE)
+
+# Values are (result, tables the command reads)
+sql_cache = LRUCache(max_entries=SQL_CACHE_MAX_ENTRIES, ttl=SQL_CACHE_TTL)
+invalidated_entries = 0
+
+_MISSING = object()
+
+def normalize_command(command: str) -> str:
+    """Collapse whitespace so formatting differences share one entry"""
+    return " ".join(command.split()).rstrip(";")
+
+def tables_in(command: str) -> Set[str]:
+    return {table.lower() for table in _TABLE_PATTERN.findall(command)}
+
+def get_cached_result(command: str) -> Tuple[bool, Any]:
+    """Return (hit, result) for a command"""
+    entry = sql_cache.get(normalize_command(command), _MISSING)
+    if entry is _MISSING:
+        return False, None
+    return True, entry[0]
+
+def cache_result(command: str, result: Any):
+    sql_cache.set(normalize_command(command), (result, tables_in(command)))
+
+def invalidate_sql_cache(table: Optional[str] = None) -> int:
+    """Drop entries reading from `table`, or everything when no table is given"""
+    global invalidated_entries
+    if table is None:
+        removed = len(sql_cache)
+        sql_cache.clear()
+    else:
+        table = table.lower()
+        removed = 0
+        for key in sql_cache.keys():
+            entry = sql_cache.peek(key)
+            if entry is not None and table in entry[1] and sql_cache.delete(key):
+                removed += 1
+    invalidated_entries += removed
+    if removed:
+        logging.info(f"SQL cache invalidated {removed} entries for table {table or '*'}")
+    return removed
+
+def get_sql_cache_stats() -> Dict:
+    return {**sql_cache.stats(), "invalidated": invalidated_entries}
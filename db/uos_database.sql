@@ -162,4 +162,27 @@ insert into guide(title, content)values
 will sign it for you then you take it back to the tomar');
 
 
---
\ No newline at end of file
+--
+--table change notifications------------------------------------------------
+-- the backend LISTENs on table_changed to invalidate its caches; one notification
+-- per write statement, payload is the table name. Tables the backend creates itself
+-- (info, faq_answers) get it from init_db when the backend starts
+create or replace function notify_table_change() returns trigger as $$
+begin
+    perform pg_notify('table_changed', TG_TABLE_NAME);
+    return null;
+end;
+$$ language plpgsql;
+
+do $$
+declare
+    t record;
+begin
+    for t in select table_name from information_schema.tables
+             where table_schema = 'public' and table_type = 'BASE TABLE' loop
+        execute format(
+            'create or replace trigger notify_change after insert or update or delete or truncate on %I '
+            'for each statement execute function notify_table_change()', t.table_name);
+    end loop;
+end
+$$;
@@ -20,4 +20,16 @@ def test_contactus():
 def test_chat_post():
     r = httpx.post(f"{base_url}/chat", json={"message": "hello"})
     assert r.status_code == 200
-    return "response" in r.json()
\ No newline at end of file
+    return "response" in r.json()
+
+def test_chat_stream_post():
+    with httpx.stream("POST", f"{base_url}/chat/stream", json={"message": "hello"}, timeout=60) as r:
+        assert r.status_code == 200
+        assert r.headers["content-type"].startswith("text/event-stream")
+        body = r.read().decode()
+    assert "event: session" in body
+    assert "event: done" in body
+
+def test_ready():
+    r = httpx.get(f"{base_url}/ready")
+    assert r.status_code in (200, 503)
@@ -0,0 +1,63 @@
+import asyncio
+import time
+
+import pytest
+
+from backend.cache import InMemoryBackend, LRUCache, RedisBackend
+
+
+def test_lru_evicts_least_recently_used():
+    cache = LRUCache(max_entries=2)
+    cache.set("a", "1")
+    cache.set("b", "2")
+    cache.get("a")
+    cache.set("c", "3")
+    assert cache.get("b") is None
+    assert cache.get("a") == "1"
+    assert cache.stats()["evictions"] == 1
+
+
+def test_lru_respects_byte_limit():
+    cache = LRUCache(max_entries=100, max_bytes=10)
+    cache.set("a", "aaaaa")
+    cache.set("b", "bbbbb")
+    cache.set("c", "c")
+    assert "a" not in cache
+    assert cache.stats()["bytes"] <= 10
+
+
+def test_lru_expires_entries():
+    cache = LRUCache(max_entries=10, ttl=0.01)
+    cache.set("a", "1")
+    time.sleep(0.02)
+    assert cache.get("a") is None
+    assert cache.stats()["expirations"] == 1
+
+
+def test_memory_backend_rate_counter():
+    async def run():
+        backend = InMemoryBackend(max_entries=10)
+        counts = [await backend.incr("1.2.3.4:3600", ttl=3600) for _ in range(3)]
+        await backend.set("answer", "hello")
+        return counts, await backend.get("answer")
+
+    assert asyncio.run(run()) == ([1, 2, 3], "hello")
+
+
+def test_redis_backend_roundtrip():
+    fakeredis = pytest.importorskip("fakeredis")
+
+    async def run():
+        backend = RedisBackend("test", ttl=60, client=fakeredis.FakeAsyncRedis())
+        await backend.set("vector", [0.1, 0.2])
+        value = await backend.get("vector")
+        counts = [await backend.incr("ip") for _ in range(2)]
+        ttl_ms = await backend.client.pttl("test:ip")
+        await backend.clear()
+        return value, counts, ttl_ms, await backend.get("vector")
+
+    value, counts, ttl_ms, cleared = asyncio.run(run())
+    assert value == [0.1, 0.2]
+    assert counts == [1, 2]
+    assert 0 < ttl_ms <= 60000
+    assert cleared is None
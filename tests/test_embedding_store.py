@@ -0,0 +1,82 @@
+import numpy as np
+
+from backend import embedding_service
+from backend.embedding_store import EmbeddingStore
+
+
+def test_vectors_persist_across_reopen(tmp_path):
+    path = str(tmp_path / "embeddings.sqlite3")
+    store = EmbeddingStore(path)
+    store.put_many("model", ["a", "b"], np.array([[1, 2], [3, 4]], dtype=np.float32))
+
+    reopened = EmbeddingStore(path)
+    a, b, missing = reopened.get_many("model", ["a", "b", "c"])
+    assert np.array_equal(a, [1, 2]) and np.array_equal(b, [3, 4])
+    assert missing is None
+    assert reopened.stats()["vectors"] == 2
+    assert reopened.hits == 2 and reopened.misses == 1
+
+
+def test_existing_vectors_are_kept(tmp_path):
+    store = EmbeddingStore(str(tmp_path / "embeddings.sqlite3"))
+    store.put_many("model", ["a"], [[1, 2]])
+    store.put_many("model", ["a", "b"], [[9, 9], [3, 4]])
+    assert np.array_equal(store.get_many("model", ["a"])[0], [1, 2])
+    assert store.stats()["vectors"] == 2
+    assert store.writes == 2
+
+
+def test_vectors_are_per_model(tmp_path):
+    store = EmbeddingStore(str(tmp_path / "embeddings.sqlite3"))
+    store.put_many("model-a", ["a"], [[1, 2]])
+    assert store.get_many("model-b", ["a"]) == [None]
+
+
+def test_duplicate_texts_share_one_lookup(tmp_path):
+    store = EmbeddingStore(str(tmp_path / "embeddings.sqlite3"))
+    store.put_many("model", ["a"], [[1, 2]])
+    vectors = store.get_many("model", ["a", "a"])
+    assert all(np.array_equal(vector, [1, 2]) for vector in vectors)
+
+
+def test_empty_path_disables_persistence():
+    store = EmbeddingStore("")
+    store.put_many("model", ["a"], [[1, 2]])
+    assert store.get_many("model", ["a"]) == [None]
+    assert store.stats()["vectors"] is None
+
+
+def fake_encode(calls):
+    def encode(texts, **kwargs):
+        calls.append(list(texts))
+        return np.array([[len(text), 1] for text in texts], dtype=np.float32)
+    return encode
+
+
+def test_encode_cached_only_encodes_unseen_texts(tmp_path, monkeypatch):
+    calls = []
+    monkeypatch.setattr(embedding_service, "embedding_store", EmbeddingStore(str(tmp_path / "embeddings.sqlite3")))
+    monkeypatch.setattr(embedding_service, "encode", fake_encode(calls))
+    embedding_service.encode_cached(["ab", "abc"])
+    vectors = embedding_service.encode_cached(["abc", "abcd", "abcd"])
+    assert calls == [["ab", "abc"], ["abcd"]]
+    assert vectors.tolist() == [[3, 1], [4, 1], [4, 1]]
+
+
+def test_encode_cached_without_persist_does_not_grow_the_store(tmp_path, monkeypatch):
+    store = EmbeddingStore(str(tmp_path / "embeddings.sqlite3"))
+    monkeypatch.setattr(embedding_service, "embedding_store", store)
+    monkeypatch.setattr(embedding_service, "encode", fake_encode([]))
+    embedding_service.encode_cached(["user question"], persist=False)
+    assert store.stats()["vectors"] == 0
+
+
+def test_encode_cached_falls_back_to_the_model_when_the_store_fails(tmp_path, monkeypatch):
+    # a directory where the database file should be: sqlite can't open it
+    path = tmp_path / "embeddings.sqlite3"
+    path.mkdir()
+    calls = []
+    monkeypatch.setattr(embedding_service, "embedding_store", EmbeddingStore(str(path)))
+    monkeypatch.setattr(embedding_service, "encode", fake_encode(calls))
+    assert embedding_service.encode_cached(["ab"]).tolist() == [[2, 1]]
+    assert calls == [["ab"]]
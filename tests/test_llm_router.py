@@ -0,0 +1,126 @@
+import asyncio
+import time
+
+import pytest
+
+from backend import llm_router
+from backend.llm_router import LLMRouter
+from backend.resilience import ProviderUnavailable
+
+
+def provider(deltas=("answer",), delay=0.0, error=None, events=None, name=None):
+    """Fake streaming provider: waits `delay`, then yields `deltas`, then raises `error`"""
+    async def stream(prompt, history, database, query_vector):
+        try:
+            if delay:
+                await asyncio.sleep(delay)
+            for delta in deltas:
+                yield delta
+            if error is not None:
+                raise error
+        finally:
+            if events is not None:
+                events.append(name)
+    return stream
+
+
+def collect(router, prompt="q"):
+    async def run():
+        items = [item async for item in router.stream(prompt)]
+        # let cancelled losers run their cleanup
+        await asyncio.sleep(0.01)
+        return items
+    return asyncio.run(run())
+
+
+@pytest.fixture(autouse=True)
+def short_hedge_delay(monkeypatch):
+    monkeypatch.setattr(llm_router, "LLM_HEDGE_DELAY", 0.05)
+
+
+def test_fast_primary_is_not_hedged():
+    router = LLMRouter({"a": provider(("hel", "lo")), "b": provider()})
+    assert collect(router) == [("a", "hel"), ("a", "lo")]
+    assert router.stats["a"].wins == 1
+    assert router.stats["b"].calls == 0
+
+
+def test_slow_primary_is_hedged_and_loser_cancelled():
+    closed = []
+    router = LLMRouter({
+        "a": provider(delay=5, events=closed, name="a"),
+        "b": provider(("from b",)),
+    })
+    started = time.perf_counter()
+    assert collect(router) == [("b", "from b")]
+    assert time.perf_counter() - started < 1
+    assert closed == ["a"]
+    assert router.stats["b"].hedged == 1
+    assert router.stats["b"].wins == 1
+    assert router.stats["a"].cancelled == 1
+
+
+def test_loser_past_its_hedge_delay_is_demoted():
+    router = LLMRouter({"a": provider(delay=5), "b": provider()})
+    collect(router)
+    assert router.stats["a"].slow_losses == 1
+    assert router.stats["a"].degraded()
+    assert router.ranked() == ["b", "a"]
+
+
+def test_short_cancelled_wait_is_not_a_failure(monkeypatch):
+    # b is hedged in at 100 ms and loses to a ~50 ms later: too short to say anything about b
+    monkeypatch.setattr(llm_router, "LLM_HEDGE_DELAY", 0.1)
+    router = LLMRouter({"a": provider(delay=0.15), "b": provider(delay=5)})
+    assert collect(router) == [("a", "answer")]
+    assert router.stats["b"].cancelled == 1
+    assert router.stats["b"].slow_losses == 0
+    assert not router.stats["b"].degraded()
+
+
+def test_error_before_first_token_fails_over_immediately(monkeypatch):
+    monkeypatch.setattr(llm_router, "LLM_HEDGE_DELAY", 5)
+    router = LLMRouter({"a": provider(deltas=(), error=RuntimeError("boom")), "b": provider(("ok",))})
+    started = time.perf_counter()
+    assert collect(router) == [("b", "ok")]
+    assert time.perf_counter() - started < 1
+    assert router.stats["a"].errors == 1
+    assert router.stats["b"].hedged == 0
+
+
+def test_unavailable_provider_is_skipped():
+    router = LLMRouter({"a": provider(deltas=(), error=ProviderUnavailable("a circuit is open")), "b": provider(("ok",))})
+    assert collect(router) == [("b", "ok")]
+    assert router.stats["a"].errors == 1
+
+
+def test_error_after_first_token_does_not_fail_over():
+    router = LLMRouter({"a": provider(("partial",), error=RuntimeError("cut off")), "b": provider()})
+
+    async def run():
+        items = []
+        with pytest.raises(RuntimeError, match="cut off"):
+            async for item in router.stream("q"):
+                items.append(item)
+        return items
+
+    assert asyncio.run(run()) == [("a", "partial")]
+    assert router.stats["b"].calls == 0
+    assert router.stats["a"].errors == 1
+
+
+def test_all_providers_failing_raises():
+    router = LLMRouter({"a": provider(deltas=(), error=RuntimeError("a")), "b": provider(deltas=(), error=RuntimeError("b"))})
+    with pytest.raises(RuntimeError, match="All LLM providers failed"):
+        collect(router)
+
+
+def test_empty_answer_yields_one_empty_delta():
+    router = LLMRouter({"a": provider(deltas=()), "b": provider()})
+    assert collect(router) == [("a", "")]
+
+
+def test_hedging_disabled_waits_for_primary():
+    router = LLMRouter({"a": provider(delay=0.1), "b": provider()}, hedge=False)
+    assert collect(router) == [("a", "answer")]
+    assert router.stats["b"].calls == 0
@@ -0,0 +1,66 @@
+import os
+
+import numpy as np
+import pytest
+
+from backend import local_index
+from backend.local_index import LocalVectorIndex
+
+IDS = ["dean-en", "dean-ku", "library-en"]
+VECTORS = [[1, 0, 0], [0.9, 0.1, 0], [0, 1, 0]]
+PAYLOADS = [{"lang": "en", "questions": "Who is the dean?"}, {"lang": "ku", "questions": "ڕاگر کێیە؟"}, {"lang": "en", "questions": "Library hours"}]
+
+
+@pytest.fixture
+def index_path(tmp_path, monkeypatch):
+    path = str(tmp_path / "index")
+    monkeypatch.setattr(local_index, "LOCAL_INDEX_PATH", path)
+    monkeypatch.setattr(local_index, "_index", None)
+    monkeypatch.setattr(local_index, "_index_mtime", None)
+    monkeypatch.setattr(local_index, "_checked_at", float("-inf"))
+    monkeypatch.setattr(local_index, "LOCAL_INDEX_CHECK_INTERVAL", 0)
+    return path
+
+
+def test_save_load_round_trip(tmp_path):
+    path = str(tmp_path / "index")
+    LocalVectorIndex.build(IDS, VECTORS, PAYLOADS).save(path)
+    loaded = LocalVectorIndex.load(path)
+    assert loaded.ids == IDS
+    assert loaded.payloads == PAYLOADS
+    assert np.allclose(np.linalg.norm(loaded.vectors, axis=1), 1)
+    assert not os.path.exists(f"{path}.tmp.npy")
+
+
+def test_search_orders_by_cosine_score():
+    index = LocalVectorIndex.build(IDS, VECTORS, PAYLOADS)
+    hits = index.search([1, 0.05, 0], limit=3)
+    assert [hit["id"] for hit in hits] == ["dean-en", "dean-ku", "library-en"]
+    assert hits[0]["score"] >= hits[1]["score"] >= hits[2]["score"]
+    assert hits[0]["payload"]["questions"] == "Who is the dean?"
+
+
+def test_search_filters_language_and_threshold():
+    index = LocalVectorIndex.build(IDS, VECTORS, PAYLOADS)
+    assert [hit["id"] for hit in index.search([1, 0, 0], limit=3, language="ku")] == ["dean-ku"]
+    assert [hit["id"] for hit in index.search([1, 0, 0], limit=3, score_threshold=0.95)] == ["dean-en", "dean-ku"]
+
+
+def test_missing_index_is_remembered(index_path, monkeypatch):
+    assert local_index.get_local_index() is None
+    monkeypatch.setattr(local_index, "LOCAL_INDEX_CHECK_INTERVAL", 60)
+    LocalVectorIndex.build(IDS, VECTORS, PAYLOADS).save(index_path)
+    # not looked for again until the check interval has passed
+    assert local_index.get_local_index() is None
+
+
+def test_rebuilt_index_is_reloaded(index_path):
+    LocalVectorIndex.build(IDS[:1], VECTORS[:1], PAYLOADS[:1]).save(index_path)
+    first = local_index.get_local_index()
+    assert len(first) == 1
+    assert local_index.get_local_index() is first
+
+    LocalVectorIndex.build(IDS, VECTORS, PAYLOADS).save(index_path)
+    stat = os.stat(f"{index_path}.json")
+    os.utime(f"{index_path}.json", ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+    assert len(local_index.get_local_index()) == 3
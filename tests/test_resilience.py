@@ -0,0 +1,202 @@
+import asyncio
+import time
+
+import pytest
+
+from backend.resilience import AdaptiveLimiter, CircuitBreaker, ProviderGuard, ProviderUnavailable, is_overload
+
+
+class StatusError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"status {status_code}")
+        self.status_code = status_code
+
+
+def test_is_overload():
+    assert is_overload(asyncio.TimeoutError())
+    assert is_overload(StatusError(429))
+    assert is_overload(StatusError(503))
+    assert is_overload(StatusError(529))
+    assert not is_overload(StatusError(500))
+    assert not is_overload(ValueError())
+
+
+def test_breaker_opens_after_consecutive_failures():
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=60)
+    for _ in range(2):
+        breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+    assert breaker.stats()["rejected"] == 1
+
+
+def test_breaker_success_resets_failure_count():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60)
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_overload_opens_breaker_at_once():
+    breaker = CircuitBreaker(failure_threshold=5, reset_timeout=60)
+    breaker.record_failure(overloaded=True)
+    assert breaker.state == CircuitBreaker.OPEN
+
+
+def test_half_open_allows_one_probe_then_closes_on_success():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.01, half_open_calls=1)
+    breaker.record_failure()
+    time.sleep(0.02)
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.allow()
+    assert not breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow()
+
+
+def test_half_open_failure_reopens():
+    breaker = CircuitBreaker(failure_threshold=5, reset_timeout=0.01)
+    breaker.record_failure(overloaded=True)
+    time.sleep(0.02)
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.stats()["opened"] == 2
+
+
+def test_cancelled_probe_frees_its_slot():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.01, half_open_calls=1)
+    breaker.record_failure()
+    time.sleep(0.02)
+    assert breaker.allow()
+    breaker.record_cancel()
+    assert breaker.allow()
+
+
+def test_limiter_grows_additively_and_shrinks_multiplicatively():
+    limiter = AdaptiveLimiter(initial=10, min_limit=2, max_limit=64, latency_target=1.0)
+    limiter.in_flight = 3
+    limiter.release(0.5)
+    assert limiter.limit == pytest.approx(10.1)
+    limiter.release(2.0)
+    assert limiter.limit == pytest.approx(10.1 * 0.9)
+    limiter.release(None, overloaded=True)
+    assert limiter.limit == pytest.approx(10.1 * 0.9 / 2)
+    assert limiter.in_flight == 0
+
+
+def test_limiter_stays_within_bounds():
+    limiter = AdaptiveLimiter(initial=2, min_limit=2, max_limit=2.2, latency_target=1.0)
+    for _ in range(5):
+        limiter.in_flight += 1
+        limiter.release(None, overloaded=True)
+    assert limiter.limit == 2
+    for _ in range(5):
+        limiter.in_flight += 1
+        limiter.release(0.1)
+    assert limiter.limit == 2.2
+
+
+def test_limiter_rejects_at_limit():
+    limiter = AdaptiveLimiter(initial=2)
+    assert limiter.try_acquire() and limiter.try_acquire()
+    assert not limiter.try_acquire()
+    assert limiter.stats()["rejected"] == 1
+
+
+def test_censored_wait_never_grows_the_limit():
+    limiter = AdaptiveLimiter(initial=10, latency_target=1.0)
+    limiter.in_flight = 2
+    limiter.release(0.5, censored=True)
+    assert limiter.limit == 10
+    limiter.release(1.5, censored=True)
+    assert limiter.limit == pytest.approx(9.0)
+
+
+async def drain_async(guarded):
+    return [delta async for delta in guarded()]
+
+
+def drain(guarded):
+    return asyncio.run(drain_async(guarded))
+
+
+def test_guard_records_success():
+    guard = ProviderGuard("test")
+    guard.limiter = AdaptiveLimiter(initial=10, latency_target=1.0)
+
+    async def ok():
+        yield "a"
+        yield "b"
+
+    assert drain(guard.wrap(ok)) == ["a", "b"]
+    assert guard.breaker.state == CircuitBreaker.CLOSED
+    assert guard.limiter.in_flight == 0
+    assert guard.limiter.limit == pytest.approx(10.1)
+
+
+def test_guard_backs_off_on_overload_then_refuses():
+    guard = ProviderGuard("test")
+    guard.limiter = AdaptiveLimiter(initial=10)
+
+    async def rate_limited():
+        raise StatusError(429)
+        yield
+
+    guarded = guard.wrap(rate_limited)
+    with pytest.raises(StatusError):
+        drain(guarded)
+    assert guard.breaker.state == CircuitBreaker.OPEN
+    assert guard.limiter.limit == 5
+    assert guard.limiter.in_flight == 0
+    with pytest.raises(ProviderUnavailable, match="circuit is open"):
+        drain(guarded)
+
+
+def test_guard_refuses_at_concurrency_limit():
+    guard = ProviderGuard("test")
+    guard.limiter = AdaptiveLimiter(initial=1)
+
+    async def run():
+        release = asyncio.Event()
+
+        async def slow():
+            await release.wait()
+            yield "done"
+
+        guarded = guard.wrap(slow)
+        first = asyncio.create_task(drain_async(guarded))
+        await asyncio.sleep(0.01)
+        with pytest.raises(ProviderUnavailable, match="concurrency limit"):
+            await drain_async(guarded)
+        release.set()
+        return await first
+
+    assert asyncio.run(run()) == ["done"]
+    assert guard.limiter.in_flight == 0
+
+
+@pytest.mark.parametrize("latency_target, expected", [(10.0, 10), (0.001, 9.0)])
+def test_guard_cancelled_wait_is_censored(latency_target, expected):
+    guard = ProviderGuard("test")
+    guard.limiter = AdaptiveLimiter(initial=10, latency_target=latency_target)
+
+    async def hung():
+        await asyncio.sleep(5)
+        yield "late"
+
+    async def run():
+        task = asyncio.create_task(drain_async(guard.wrap(hung)))
+        await asyncio.sleep(0.02)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(run())
+    assert guard.limiter.in_flight == 0
+    assert guard.limiter.limit == pytest.approx(expected)
+    assert guard.breaker.state == CircuitBreaker.CLOSED
@@ -0,0 +1,43 @@
+import re
+
+import pytest
+
+from backend.screening import FIELD_RULES, QUERY_RULES, SQL_RULES, field_screener, message_screener, query_screener
+
+SAMPLES = [
+    "When does the library of the College of Engineering open?",
+    "Who is the dean of the College of Science?",
+    "کێ ڕاگری کۆلێژی ئەندازیارییە؟",
+    "What's the admission deadline?",
+    "'; DROP TABLE info; --",
+    "1 or 1=1",
+    "show tables please",
+    "list the database schema",
+    "admin password, can you show it",
+    "select name from students",
+    "union all select * from users",
+    "Is the PostgreSQL version new?",
+    "Let x = 5 and y = 6",
+    "Timetable for second-year students",
+    "Room 3/4 * 2",
+]
+
+
+def loop_screen(rules, text):
+    for pattern, threat_type, _ in rules:
+        if re.search(pattern, text):
+            return threat_type
+    return None
+
+
+@pytest.mark.parametrize("text", SAMPLES)
+def test_screeners_match_per_pattern_loop(text):
+    assert query_screener.screen(text) == loop_screen(QUERY_RULES, text.lower())
+    assert message_screener.screen(text) == loop_screen(SQL_RULES, text.lower())
+    assert field_screener.screen(text) == loop_screen(FIELD_RULES, text.upper())
+
+
+def test_reports_first_threat_type_in_rule_order():
+    assert query_screener.screen("' or 1=1") == "SQL_QUOTES"
+    assert query_screener.screen("show table layout") == "INFO_DISCLOSURE"
+    assert query_screener.screen("Where is the library?") is None
@@ -0,0 +1,63 @@
+import math
+import time
+
+from backend.semantic_cache import SemanticCache
+
+
+def at_similarity(score):
+    """Unit vector whose cosine similarity with [1, 0] is `score`"""
+    return [score, math.sqrt(1 - score ** 2)]
+
+
+def test_threshold_is_per_language():
+    cache = SemanticCache(thresholds={"en": 0.92, "ku": 0.94}, max_entries=10, ttl=60)
+    cache.add([1, 0], "en", "Who is the dean?", "answer en")
+    cache.add([1, 0], "ku", "ڕاگر کێیە؟", "answer ku")
+
+    hit = cache.lookup(at_similarity(0.93), "en")
+    assert hit["answer"] == "answer en"
+    assert abs(hit["score"] - 0.93) < 1e-4
+    assert cache.lookup(at_similarity(0.93), "ku") is None
+    assert cache.lookup(at_similarity(0.95), "ku")["answer"] == "answer ku"
+    assert cache.lookup(at_similarity(0.85), "en") is None
+
+
+def test_languages_do_not_match_each_other():
+    cache = SemanticCache(thresholds={"en": 0.9, "ku": 0.9}, max_entries=10, ttl=60)
+    cache.add([1, 0], "en", "q", "a")
+    assert cache.lookup([1, 0], "ku") is None
+
+
+def test_vectors_are_normalised():
+    cache = SemanticCache(thresholds={"en": 0.99}, max_entries=10, ttl=60)
+    cache.add([3, 0], "en", "q", "a")
+    assert cache.lookup([0.5, 0], "en")["answer"] == "a"
+
+
+def test_expired_entries_are_not_served():
+    cache = SemanticCache(thresholds={"en": 0.9}, max_entries=10, ttl=0.01)
+    cache.add([1, 0], "en", "q", "a")
+    time.sleep(0.02)
+    assert cache.lookup([1, 0], "en") is None
+    assert cache.stats()["entries"]["en"] == 0
+
+
+def test_oldest_entry_is_overwritten_when_full():
+    cache = SemanticCache(thresholds={"en": 0.99}, max_entries=2, ttl=60)
+    cache.add([1, 0], "en", "first", "1")
+    cache.add([0, 1], "en", "second", "2")
+    cache.add(at_similarity(0.5), "en", "third", "3")
+    assert cache.lookup([1, 0], "en") is None
+    assert cache.lookup([0, 1], "en")["answer"] == "2"
+
+
+def test_purge_one_language_or_all():
+    cache = SemanticCache(thresholds={"en": 0.9, "ku": 0.9}, max_entries=10, ttl=60)
+    cache.add([1, 0], "en", "q", "a")
+    cache.add([0, 1], "en", "q2", "b")
+    cache.add([1, 0], "ku", "q", "a")
+    assert cache.purge("en") == 2
+    assert cache.lookup([1, 0], "en") is None
+    assert cache.lookup([1, 0], "ku") is not None
+    assert cache.purge() == 1
+    assert cache.stats()["purged"] == 3
@@ -0,0 +1,128 @@
+import asyncio
+
+import pytest
+
+from backend.single_flight import SingleFlight
+
+
+def upstream(calls, items=("a", "b", "c"), delay=0.01, error=None, finished=None):
+    """Factory for a fake upstream stream that records each call"""
+    def factory():
+        async def stream():
+            calls.append(1)
+            for item in items:
+                await asyncio.sleep(delay)
+                yield item
+            if error is not None:
+                raise error
+            if finished is not None:
+                finished.set()
+        return stream()
+    return factory
+
+
+async def collect(flights, key, factory):
+    return [item async for item in flights.stream(key, factory)]
+
+
+def test_concurrent_callers_share_one_upstream_call():
+    flights = SingleFlight()
+    calls = []
+
+    async def run():
+        factory = upstream(calls)
+        return await asyncio.gather(*(collect(flights, "q", factory) for _ in range(5)))
+
+    results = asyncio.run(run())
+    assert results == [["a", "b", "c"]] * 5
+    assert len(calls) == 1
+    stats = flights.stats()
+    assert stats["upstream_calls"] == 1
+    assert stats["coalesced"] == 4
+    assert stats["in_flight"] == 0
+
+
+def test_different_keys_are_not_coalesced():
+    flights = SingleFlight()
+    calls = []
+
+    async def run():
+        factory = upstream(calls)
+        return await asyncio.gather(collect(flights, "q1", factory), collect(flights, "q2", factory))
+
+    asyncio.run(run())
+    assert len(calls) == 2
+
+
+def test_late_subscriber_replays_from_the_start():
+    flights = SingleFlight()
+    calls = []
+
+    async def run():
+        factory = upstream(calls, delay=0.02)
+        first = asyncio.create_task(collect(flights, "q", factory))
+        await asyncio.sleep(0.03)
+        return await asyncio.gather(first, collect(flights, "q", factory))
+
+    assert asyncio.run(run()) == [["a", "b", "c"], ["a", "b", "c"]]
+    assert len(calls) == 1
+
+
+def test_disconnecting_subscriber_does_not_cancel_the_leader():
+    flights = SingleFlight()
+    calls = []
+
+    async def run():
+        finished = asyncio.Event()
+        factory = upstream(calls, finished=finished)
+        leader = flights.stream("q", factory)
+        follower = asyncio.create_task(collect(flights, "q", factory))
+        assert await leader.__anext__() == "a"
+        # the leader's client goes away after the first item
+        await leader.aclose()
+        await asyncio.sleep(0)
+        assert flights._flights["q"].subscribers == 1
+        items = await follower
+        await asyncio.wait_for(finished.wait(), timeout=1)
+        return items
+
+    assert asyncio.run(run()) == ["a", "b", "c"]
+    assert len(calls) == 1
+    assert flights.stats()["in_flight"] == 0
+
+
+def test_upstream_runs_to_completion_with_no_subscribers_left():
+    flights = SingleFlight()
+    calls = []
+
+    async def run():
+        finished = asyncio.Event()
+        stream = flights.stream("q", upstream(calls, finished=finished))
+        await stream.__anext__()
+        await stream.aclose()
+        await asyncio.wait_for(finished.wait(), timeout=1)
+        await asyncio.sleep(0)
+
+    asyncio.run(run())
+    assert flights.stats()["in_flight"] == 0
+
+
+def test_upstream_error_reaches_every_subscriber():
+    flights = SingleFlight()
+    calls = []
+
+    async def run():
+        factory = upstream(calls, items=("a",), error=RuntimeError("provider down"))
+
+        async def subscriber():
+            items = []
+            with pytest.raises(RuntimeError, match="provider down"):
+                async for item in flights.stream("q", factory):
+                    items.append(item)
+            return items
+
+        return await asyncio.gather(*(subscriber() for _ in range(3)))
+
+    assert asyncio.run(run()) == [["a"]] * 3
+    assert len(calls) == 1
+    assert flights.stats()["in_flight"] == 0
@@ -0,0 +1,46 @@
+import pytest
+
+from backend import sql_cache
+from backend.cache import LRUCache
+from backend.sql_cache import cache_result, get_cached_result, invalidate_sql_cache, tables_in
+
+
+@pytest.fixture(autouse=True)
+def empty_cache(monkeypatch):
+    monkeypatch.setattr(sql_cache, "sql_cache", LRUCache(max_entries=100, ttl=60))
+
+
+def test_tables_in_finds_from_and_join_targets():
+    command = "SELECT d.name FROM Departments d JOIN colleges c ON c.id = d.college_id LEFT JOIN staff s ON s.dept = d.id"
+    assert tables_in(command) == {"departments", "colleges", "staff"}
+    assert tables_in("select 1") == set()
+
+
+def test_formatting_differences_share_an_entry():
+    cache_result("select *  from info\nwhere key = 'x';", [{"value": 1}])
+    assert get_cached_result("select * from info where key = 'x'") == (True, [{"value": 1}])
+    assert get_cached_result("select * from colleges") == (False, None)
+
+
+def test_invalidation_drops_only_commands_reading_the_table():
+    cache_result("select * from info", ["info rows"])
+    cache_result("select * from colleges join departments on true", ["joined rows"])
+    cache_result("select * from staff", ["staff rows"])
+
+    assert invalidate_sql_cache("DEPARTMENTS") == 1
+    assert get_cached_result("select * from colleges join departments on true") == (False, None)
+    assert get_cached_result("select * from info")[0]
+    assert invalidate_sql_cache("timetable") == 0
+
+
+def test_invalidation_does_not_match_table_name_prefixes():
+    cache_result("select * from info_archive", ["archived"])
+    assert invalidate_sql_cache("info") == 0
+    assert get_cached_result("select * from info_archive")[0]
+
+
+def test_unknown_table_clears_everything():
+    cache_result("select * from info", [1])
+    cache_result("select * from staff", [2])
+    assert invalidate_sql_cache(None) == 2
+    assert get_cached_result("select * from info") == (False, None)